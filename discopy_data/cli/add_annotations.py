@@ -1,4 +1,3 @@
-import json
 import sys
 
 import click
@@ -7,6 +6,8 @@ from tqdm import tqdm
 import discopy_data.dataset.argessay
 import discopy_data.dataset.pdtb
 import discopy_data.dataset.pdtb3
+from discopy_data.cli.utils import File
+from discopy_data.data.codec import JsonlWriter, read_jsonl
 from discopy_data.data.doc import Document
 
 document_annotations = {
@@ -19,23 +20,21 @@ document_annotations = {
 @click.command()
 @click.argument('corpus', type=str)
 @click.argument('annotations', type=str)
-@click.option('-s', '--src', default='-', type=click.File('r'))
-@click.option('-o', '--tgt', default='-', type=click.File('w'))
+@click.option('-s', '--src', default='-', type=File('r'))
+@click.option('-o', '--tgt', default='-', type=File('w'))
 @click.option('--simple-connectives', is_flag=True)
 @click.option('--sense-level', default=-1, type=int)
-def main(corpus, annotations, src, tgt, simple_connectives, sense_level):
+@click.option('--flush-interval', default=16, type=int)
+def main(corpus, annotations, src, tgt, simple_connectives, sense_level, flush_interval):
     options = {
         'simple_connectives': simple_connectives,
         'sense_level': sense_level,
     }
     update_annotations = document_annotations[corpus](annotations, options)
-    for line in tqdm(src):
-        if not line.strip():
-            continue
-        doc = Document.from_json(json.loads(line))
-        doc = update_annotations(doc)
-        tgt.write(json.dumps(doc.to_json()) + '\n')
-        tgt.flush()
+    with JsonlWriter(tgt, flush_interval) as writer:
+        for doc in tqdm(read_jsonl(src)):
+            doc = update_annotations(Document.from_json(doc, lazy=True))
+            writer.write(doc.to_json())
     sys.stderr.write('Annotation done!\n')
 
 
@@ -0,0 +1,28 @@
+import sys
+
+import click
+
+from discopy_data.cli.utils import File
+from discopy_data.data.codec import read_jsonl
+from discopy_data.data.doc import Document
+from discopy_data.data.loaders.binary import write_documents
+
+
+def read_documents(fh, tags):
+    tags = tags.split(',') if tags else []
+    for doc in read_jsonl(fh):
+        if not tags or doc.get('meta', {}).get('part', '') in tags:
+            yield Document.from_json(doc, lazy=True)
+
+
+@click.command()
+@click.argument('tgt', type=click.Path(file_okay=False))
+@click.option('-i', '--src', default='-', type=File('r'))
+@click.option('--tags', default='', type=str)
+def main(tgt, src, tags):
+    n_docs = write_documents(tgt, read_documents(src, tags))
+    sys.stderr.write(f'wrote {n_docs} documents to {tgt}\n')
+
+
+if __name__ == '__main__':
+    main()
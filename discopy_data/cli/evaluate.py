@@ -0,0 +1,29 @@
+import sys
+
+import click
+
+from discopy_data.cli.utils import File
+from discopy_data.data.codec import read_jsonl
+from discopy_data.data.doc import Document
+from discopy_data.evaluation.conll import evaluate, format_results
+
+
+def read_documents(fh):
+    for doc in read_jsonl(fh):
+        yield Document.from_json(doc, load_dependencies=False, lazy=True)
+
+
+@click.command()
+@click.argument('gold', type=File('r'))
+@click.argument('pred', type=File('r'))
+@click.option('--partial', is_flag=True)
+@click.option('--cutoff', default=0.7, type=float)
+@click.option('-p', '--processes', default=1, type=int)
+def main(gold, pred, partial, cutoff, processes):
+    results = evaluate(read_documents(gold), read_documents(pred), partial=partial, cutoff=cutoff,
+                       processes=processes)
+    sys.stdout.write(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,8 @@
 import datetime
-import json
-import os
 import sys
 from typing import List
 
 import click
-import trankit
 from tqdm import tqdm
 
 import discopy_data.dataset.anthology
@@ -22,9 +19,13 @@ import discopy_data.dataset.short_stories
 import discopy_data.dataset.ted
 import discopy_data.dataset.tedmdb
 import discopy_data.dataset.un_debates
+from discopy_data.cli.utils import File
+from discopy_data.data.codec import JsonlWriter
 from discopy_data.data.doc import Document
 from discopy_data.data.sentence import Sentence, DepRel
+from discopy_data.data.shards import STRATEGIES, ShardedWriter
 from discopy_data.data.token import Token
+from discopy_data.nn.registry import get_model
 
 document_extractor = {
     'anthology': discopy_data.dataset.anthology.extract,
@@ -41,12 +42,7 @@ document_extractor = {
 
 
 def load_parser(use_gpu=False):
-    tmp_stdout = sys.stdout
-    sys.stdout = sys.stderr
-    parser = trankit.Pipeline('english', cache_dir=os.path.expanduser('~/.trankit/'), gpu=use_gpu)
-    parser("Init")
-    sys.stdout = tmp_stdout
-    return parser
+    return get_model('trankit', 'english', 'gpu' if use_gpu else 'cpu')
 
 
 def get_parsed_sentences_raw(parser, doc):
@@ -82,7 +78,7 @@ simple_map = {
 
 
 def get_parsed_sentences_tokenized(parser, doc):
-    doc = Document.from_json(doc, load_dependencies=False, load_relations=False)
+    doc = Document.from_json(doc, load_dependencies=False, load_relations=False, lazy=True)
     parser_in = [[simple_map.get(t.surface, t.surface) for t in sent.tokens] for sent in doc.sentences]
     parsed = parser(parser_in)
     token_offset = 0
@@ -115,29 +111,40 @@ def get_parsed_sentences(parser, doc) -> List[dict]:
 @click.command()
 @click.argument('corpus', type=str)
 @click.argument('src', type=click.Path('r'))
-@click.option('-o', '--tgt', default='-', type=click.File('w'))
+@click.option('-o', '--tgt', default='-', type=File('w'))
 @click.option('-l', '--limit', default=0, type=int)
 @click.option('-s', '--skip', default=0, type=int)
 @click.option('--use-gpu', is_flag=True)
-def main(corpus, src, tgt, limit, skip, use_gpu):
+@click.option('--flush-interval', default=16, type=int)
+@click.option('--shards', default=0, type=int)
+@click.option('--shard-dir', default='', type=click.Path(file_okay=False))
+@click.option('--shard-by', default='hash', type=click.Choice(STRATEGIES))
+@click.option('--shard-ext', default='.json', type=str)
+def main(corpus, src, tgt, limit, skip, use_gpu, flush_interval, shards, shard_dir, shard_by, shard_ext):
+    if shards and not shard_dir:
+        raise click.UsageError('--shards requires --shard-dir')
     parser = load_parser(use_gpu=use_gpu)
     t = tqdm()
     doc_i = 0
-    for doc in document_extractor[corpus](src):
-        if skip > 0:
-            skip -= 1
-            continue
-        if limit and doc_i >= limit:
-            break
-        if 'docID' not in doc:
-            doc['docID'] = f"{doc['meta']['corpus']}_{doc_i:05}"
-        doc['meta']['created'] = datetime.datetime.now().isoformat()
-        sentences = get_parsed_sentences(parser, doc)
-        doc['sentences'] = sentences
-        tgt.write(json.dumps(doc) + '\n')
-        tgt.flush()
-        doc_i += 1
-        t.update(1)
+    if shards:
+        writer = ShardedWriter(shard_dir, shards, strategy=shard_by, ext=shard_ext, flush_interval=flush_interval)
+    else:
+        writer = JsonlWriter(tgt, flush_interval)
+    with writer:
+        for doc in document_extractor[corpus](src):
+            if skip > 0:
+                skip -= 1
+                continue
+            if limit and doc_i >= limit:
+                break
+            if 'docID' not in doc:
+                doc['docID'] = f"{doc['meta']['corpus']}_{doc_i:05}"
+            doc['meta']['created'] = datetime.datetime.now().isoformat()
+            sentences = get_parsed_sentences(parser, doc)
+            doc['sentences'] = sentences
+            writer.write(doc)
+            doc_i += 1
+            t.update(1)
     t.close()
     sys.stderr.write('Extraction done!\n')
 
@@ -0,0 +1,19 @@
+import click
+
+from discopy_data.data.compression import get_compressor, open_file
+
+
+class File(click.File):
+    # click.File that reads and writes .gz, .bz2, and .xz files transparently
+    name = 'file'
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, str) and value != '-' and get_compressor(value) is not None:
+            try:
+                f = open_file(value, self.mode)
+            except OSError as e:
+                self.fail(f'{click.utils.format_filename(value)!r}: {e.strerror}', param, ctx)
+            if ctx is not None:
+                ctx.call_on_close(f.close)
+            return f
+        return super().convert(value, param, ctx)
@@ -0,0 +1,134 @@
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from .doc import Document
+from .relation import Relation
+
+PARTS = ('arg1', 'arg2', 'conn')
+# position of both arguments together in RelationParts.parts
+ARGS = 3
+
+
+def get_incidence(indices: List[np.ndarray], n_tokens: int) -> np.ndarray:
+    # one row per token index array with ones at the contained token indices
+    incidence = np.zeros((len(indices), n_tokens), dtype=np.float32)
+    rows = np.repeat(np.arange(len(indices)), [len(i) for i in indices])
+    incidence[rows, np.concatenate(indices or [np.zeros(0, dtype=np.int32)])] = 1
+    return incidence
+
+
+class RelationParts:
+
+    def __init__(self, relations: List[Relation]):
+        self.relations: List[Relation] = relations
+        arg1 = [r.arg1.indices for r in relations]
+        arg2 = [r.arg2.indices for r in relations]
+        conn = [r.conn.indices for r in relations]
+        args = [np.union1d(a1, a2) for a1, a2 in zip(arg1, arg2)]
+        # token indices of arg1, arg2, conn, and both arguments for each relation
+        self.parts: List[List[np.ndarray]] = [arg1, arg2, conn, args]
+        self.n_tokens: int = max((int(p[-1]) + 1 for part in self.parts for p in part if len(p)), default=0)
+        # first and last sentence touched by each relation, (-1, -1) for empty relations
+        self.sent_spans: np.ndarray = np.array([self.get_sentence_span(r) for r in relations],
+                                               dtype=np.int32).reshape(-1, 2)
+
+    @staticmethod
+    def get_sentence_span(relation: Relation) -> Tuple[int, int]:
+        sent_idxs = [t.sent_idx for part in PARTS for t in getattr(relation, part).tokens]
+        if not sent_idxs:
+            return -1, -1
+        return min(sent_idxs), max(sent_idxs)
+
+    def __len__(self):
+        return len(self.relations)
+
+    def get_incidence(self, part: int, n_tokens: int) -> np.ndarray:
+        return get_incidence(self.parts[part], n_tokens)
+
+
+def get_distance_matrix(a: RelationParts, b: RelationParts, sentence_blocking=False) -> np.ndarray:
+    # Relation.distance for all pairs of relations of the same document
+    n_tokens = max(a.n_tokens, b.n_tokens)
+    distances = np.zeros((len(a), len(b)), dtype=np.float32)
+    for part in range(len(a.parts)):
+        x, y = a.get_incidence(part, n_tokens), b.get_incidence(part, n_tokens)
+        intersection = x @ y.T
+        union = x.sum(axis=1)[:, None] + y.sum(axis=1)[None, :] - intersection
+        distances += 1 - np.where(union > 0, intersection / np.maximum(union, 1), 1)
+        if part == ARGS:
+            overlap = intersection
+    distances /= len(a.parts)
+    # pairs whose arguments share no token are never aligned, even if both connectives are empty
+    distances[overlap == 0] = np.inf
+    if sentence_blocking:
+        disjoint = ((a.sent_spans[:, None, 1] < b.sent_spans[None, :, 0]) |
+                    (b.sent_spans[None, :, 1] < a.sent_spans[:, None, 0]))
+        # blocked pairs are never aligned, whatever the distance threshold
+        distances[disjoint] = np.inf
+    return distances
+
+
+def get_assignment(distances: np.ndarray, max_distance=1.0, optimal=True) -> List[Tuple[int, int]]:
+    # pairs are kept below max_distance, pairs without argument overlap have an infinite distance
+    # the optimal assignment requires scipy, without it the greedy assignment is used
+    if optimal:
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:
+            optimal = False
+    if optimal:
+        # blocked pairs get a finite cost above every real distance, so a full assignment always exists
+        rows, cols = linear_sum_assignment(np.where(np.isinf(distances), 2, distances))
+    else:
+        order = np.argsort(distances, axis=None, kind='stable')
+        rows, cols = [], []
+        used_rows, used_cols = set(), set()
+        for row, col in zip(*np.unravel_index(order, distances.shape)):
+            if row not in used_rows and col not in used_cols:
+                used_rows.add(row)
+                used_cols.add(col)
+                rows.append(row)
+                cols.append(col)
+        rows, cols = np.array(rows, dtype=int), np.array(cols, dtype=int)
+    keep = distances[rows, cols] < max_distance
+    return list(zip(rows[keep].tolist(), cols[keep].tolist()))
+
+
+class RelationIndex:
+
+    def __init__(self, docs: Iterable[Document], sentence_blocking=True):
+        self.sentence_blocking = sentence_blocking
+        self.documents: Dict[str, RelationParts] = {doc.doc_id: RelationParts(doc.relations) for doc in docs}
+
+    def __len__(self):
+        return sum(len(parts) for parts in self.documents.values())
+
+    def get_relations(self, doc_id) -> List[Relation]:
+        parts = self.documents.get(doc_id)
+        return parts.relations if parts else []
+
+    def get_distances(self, doc_id, relations: List[Relation]) -> np.ndarray:
+        # distance matrix of shape (len(relations), number of indexed relations of the document)
+        return get_distance_matrix(RelationParts(relations), self.documents.get(doc_id, RelationParts([])),
+                                   sentence_blocking=self.sentence_blocking)
+
+    def get_best_matches(self, doc_id, relations: List[Relation], k=1,
+                         max_distance=1.0) -> List[List[Tuple[Relation, float]]]:
+        distances = self.get_distances(doc_id, relations)
+        candidates = self.get_relations(doc_id)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return [[(candidates[j], float(distances[i, j])) for j in order[i].tolist() if distances[i, j] < max_distance]
+                for i in range(len(relations))]
+
+    def align(self, doc_id, relations: List[Relation], max_distance=1.0,
+              optimal=True) -> List[Tuple[Relation, Relation, float]]:
+        distances = self.get_distances(doc_id, relations)
+        candidates = self.get_relations(doc_id)
+        return [(relations[i], candidates[j], float(distances[i, j]))
+                for i, j in get_assignment(distances, max_distance, optimal)]
+
+    def align_documents(self, docs: Iterable[Document], max_distance=1.0,
+                        optimal=True) -> Iterator[Tuple[Document, List[Tuple[Relation, Relation, float]]]]:
+        for doc in docs:
+            yield doc, self.align(doc.doc_id, doc.relations, max_distance, optimal)
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import time
+from typing import Any, Iterable, Optional, TextIO
+
+# name of the json backend, DISCOPY_JSON=json forces the standard library
+BACKEND = 'json'
+if os.environ.get('DISCOPY_JSON', 'orjson') == 'orjson':
+    try:
+        import orjson
+
+        BACKEND = 'orjson'
+    except ImportError:
+        pass
+
+
+def loads(s) -> Any:
+    if BACKEND == 'orjson':
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def dumps(obj) -> str:
+    if BACKEND == 'orjson':
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf8')
+    return json.dumps(obj)
+
+
+def read_jsonl(fh: Iterable) -> Iterable[Any]:
+    for line in fh:
+        if line.strip():
+            yield loads(line)
+
+
+class JsonlWriter:
+
+    def __init__(self, fh: TextIO, flush_interval: int = 64):
+        # lines are buffered and written with one call every flush_interval records, values below 2 flush each record
+        self.fh = fh
+        self.flush_interval = max(1, flush_interval)
+        self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def write(self, obj):
+        self.buffer.append(dumps(obj))
+        if len(self.buffer) >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.buffer.append('')
+            self.fh.write('\n'.join(self.buffer))
+            self.buffer = []
+        self.fh.flush()
+
+
+def benchmark(path: str, limit: Optional[int] = None):
+    # records per second for reading and writing the jsonl file with the standard library and the active backend
+    global BACKEND
+    with open(path) as fh:
+        lines = [line for line in fh if line.strip()][:limit]
+    backend = BACKEND
+    for name in sorted({'json', backend}):
+        BACKEND = name
+        t = time.perf_counter()
+        docs = [loads(line) for line in lines]
+        t_read = time.perf_counter() - t
+        with open(os.devnull, 'w') as null:
+            t = time.perf_counter()
+            with JsonlWriter(null) as writer:
+                for doc in docs:
+                    writer.write(doc)
+            t_write = time.perf_counter() - t
+        sys.stdout.write(f'{name:<8} read {len(lines) / t_read:10.1f} rec/s  '
+                         f'write {len(lines) / t_write:10.1f} rec/s\n')
+    BACKEND = backend
+
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,329 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .relation import Relation
+from .sentence import DepRel, Sentence
+from .strings import STRINGS
+from .token import Token
+from .tree import ConstituencyTree, get_tree_json
+
+# marks tokens of sentences without a dependency entry
+NO_HEAD = -2
+
+
+class TokenColumns:
+
+    def __init__(self, surfaces: List[str], offset_begin: np.ndarray, offset_end: np.ndarray,
+                 sent_idx: np.ndarray, local_idx: np.ndarray, upos: np.ndarray, xpos: np.ndarray,
+                 lemma: np.ndarray, sent_bounds: np.ndarray):
+        self.surfaces: List[str] = surfaces
+        self.offset_begin: np.ndarray = offset_begin
+        self.offset_end: np.ndarray = offset_end
+        self.sent_idx: np.ndarray = sent_idx
+        self.local_idx: np.ndarray = local_idx
+        # ids into STRINGS
+        self.upos: np.ndarray = upos
+        self.xpos: np.ndarray = xpos
+        self.lemma: np.ndarray = lemma
+        # token index of the first token of each sentence, plus the total number of tokens
+        self.sent_bounds: np.ndarray = sent_bounds
+
+    @staticmethod
+    def from_json(sentences: List[dict]) -> 'TokenColumns':
+        tokens = [t for sent in sentences for t in sent['tokens']]
+        lengths = np.array([len(sent['tokens']) for sent in sentences], dtype=np.int64)
+        sent_bounds = np.zeros(len(sentences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=sent_bounds[1:])
+        sent_idx = np.repeat(np.arange(len(sentences), dtype=np.int32), lengths)
+        local_idx = (np.arange(len(tokens), dtype=np.int64) - sent_bounds[sent_idx]).astype(np.int32)
+        return TokenColumns(
+            surfaces=[t['surface'] for t in tokens],
+            offset_begin=np.array([t['characterOffsetBegin'] for t in tokens], dtype=np.int32),
+            offset_end=np.array([t['characterOffsetEnd'] for t in tokens], dtype=np.int32),
+            sent_idx=sent_idx,
+            local_idx=local_idx,
+            upos=STRINGS.encode(t.get('upos', "") for t in tokens),
+            xpos=STRINGS.encode(t.get('xpos', "") for t in tokens),
+            lemma=STRINGS.encode(t.get('lemma', "") for t in tokens),
+            sent_bounds=sent_bounds,
+        )
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def get_sentence_count(self) -> int:
+        return len(self.sent_bounds) - 1
+
+    def get_sentence_range(self, sent_i: int) -> range:
+        return range(int(self.sent_bounds[sent_i]), int(self.sent_bounds[sent_i + 1]))
+
+    def get_token(self, i: int) -> Token:
+        return Token(i, int(self.sent_idx[i]), int(self.local_idx[i]),
+                     int(self.offset_begin[i]), int(self.offset_end[i]), self.surfaces[i],
+                     upos=STRINGS[self.upos[i]], xpos=STRINGS[self.xpos[i]], lemma=STRINGS[self.lemma[i]])
+
+    def get_tokens(self) -> List[Token]:
+        return [
+            Token(i, s_i, l_i, b, e, surface, upos=STRINGS[u], xpos=STRINGS[x], lemma=STRINGS[lem])
+            for i, (s_i, l_i, b, e, surface, u, x, lem) in enumerate(zip(
+                self.sent_idx.tolist(), self.local_idx.tolist(), self.offset_begin.tolist(),
+                self.offset_end.tolist(), self.surfaces, self.upos.tolist(), self.xpos.tolist(),
+                self.lemma.tolist()))
+        ]
+
+    def get_sentence_text(self, sent_i: int) -> str:
+        begin, end = int(self.sent_bounds[sent_i]), int(self.sent_bounds[sent_i + 1])
+        if begin == end:
+            return ''
+        glued = (self.offset_end[begin:end - 1] == self.offset_begin[begin + 1:end]).tolist()
+        return ''.join([self.surfaces[begin]] +
+                       [('' if g else ' ') + s for g, s in zip(glued, self.surfaces[begin + 1:end])])
+
+    def get_text(self) -> str:
+        return '\n'.join(self.get_sentence_text(sent_i) for sent_i in range(self.get_sentence_count()))
+
+    def to_json(self, i: int) -> dict:
+        return {
+            'surface': self.surfaces[i],
+            'characterOffsetBegin': int(self.offset_begin[i]),
+            'characterOffsetEnd': int(self.offset_end[i]),
+            'upos': STRINGS[self.upos[i]],
+            'xpos': STRINGS[self.xpos[i]],
+            'lemma': STRINGS[self.lemma[i]]
+        }
+
+    def tokens_to_json(self, token_range: range) -> List[dict]:
+        begin, end = token_range.start, token_range.stop
+        strings = STRINGS.strings
+        return [
+            {'surface': surface, 'characterOffsetBegin': b, 'characterOffsetEnd': e,
+             'upos': strings[u], 'xpos': strings[x], 'lemma': strings[lem]}
+            for surface, b, e, u, x, lem in zip(
+                self.surfaces[begin:end], self.offset_begin[begin:end].tolist(), self.offset_end[begin:end].tolist(),
+                self.upos[begin:end].tolist(), self.xpos[begin:end].tolist(), self.lemma[begin:end].tolist())
+        ]
+
+
+class DependencyColumns:
+
+    def __init__(self, head: np.ndarray, deprel: np.ndarray):
+        # local index of the head token, -1 for the root and NO_HEAD for tokens without dependency entry
+        self.head: np.ndarray = head
+        # ids into STRINGS
+        self.deprel: np.ndarray = deprel
+
+    @staticmethod
+    def from_json(sentences: List[dict], n_tokens: int) -> 'DependencyColumns':
+        head = np.full(n_tokens, NO_HEAD, dtype=np.int32)
+        deprel = np.zeros(n_tokens, dtype=np.int32)
+        offset = 0
+        for sent in sentences:
+            deps = sent.get('dependencies', [])
+            if deps:
+                head[offset:offset + len(deps)] = [int(d['head']) for d in deps]
+                deprel[offset:offset + len(deps)] = STRINGS.encode(d['deprel'] for d in deps)
+            offset += len(sent['tokens'])
+        return DependencyColumns(head, deprel)
+
+    def to_json(self, token_range: range) -> List[dict]:
+        # heads that do not survive loading (see get_dependencies) are written as root
+        begin, end = token_range.start, token_range.stop
+        strings = STRINGS.strings
+        return [{'head': h if h > 0 else -1, 'deprel': strings[r]}
+                for h, r in zip(self.head[begin:end].tolist(), self.deprel[begin:end].tolist())
+                if h != NO_HEAD]
+
+
+class RelationColumns:
+    ARG1, ARG2, CONN = 0, 1, 2
+
+    def __init__(self, indices: np.ndarray, bounds: np.ndarray, senses: List[List[str]], types: List[str]):
+        # flat token indices of all relation parts, ordered arg1, arg2, conn per relation
+        self.indices: np.ndarray = indices
+        # start of each part within indices, shape (3 * n_relations + 1)
+        self.bounds: np.ndarray = bounds
+        self.senses: List[List[str]] = senses
+        self.types: List[str] = types
+
+    @staticmethod
+    def from_json(relations: List[dict]) -> 'RelationColumns':
+        parts = [rel[part]['TokenList'] for rel in relations for part in ('Arg1', 'Arg2', 'Connective')]
+        bounds = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=bounds[1:])
+        indices = np.fromiter((i for p in parts for i in p), dtype=np.int32, count=int(bounds[-1]))
+        return RelationColumns(indices, bounds,
+                               senses=[rel['Sense'] for rel in relations],
+                               types=[rel['Type'] for rel in relations])
+
+    def __len__(self):
+        return len(self.types)
+
+    def get_part(self, rel_i: int, part: int) -> np.ndarray:
+        i = 3 * rel_i + part
+        return self.indices[self.bounds[i]:self.bounds[i + 1]]
+
+
+class DocumentColumns:
+
+    def __init__(self, tokens: TokenColumns = None, dependencies: DependencyColumns = None,
+                 relations: RelationColumns = None, parsetrees: List[Optional[str]] = None,
+                 trees: List[Optional[ConstituencyTree]] = None, raw: dict = None, load_dependencies=True,
+                 load_relations=True):
+        self._tokens: TokenColumns = tokens
+        self._dependencies: DependencyColumns = dependencies
+        self._relations: RelationColumns = relations
+        # parse tree strings, None where only the array encoded tree is available
+        self._parsetrees: List[Optional[str]] = parsetrees
+        self._trees: List[Optional[ConstituencyTree]] = trees
+        # json document the missing layers are decoded from on first access
+        self.raw: dict = raw
+        self.load_dependencies = load_dependencies
+        self.load_relations = load_relations
+
+    @staticmethod
+    def from_json(doc: dict, load_dependencies=True, load_relations=True, lazy=False) -> 'DocumentColumns':
+        columns = DocumentColumns(raw=doc, load_dependencies=load_dependencies, load_relations=load_relations)
+        if not lazy:
+            columns.decode()
+        return columns
+
+    def decode(self):
+        _ = self.tokens, self.dependencies, self.relations, self.parsetrees, self.trees
+        self.raw = None
+
+    @property
+    def tokens(self) -> TokenColumns:
+        if self._tokens is None:
+            self._tokens = TokenColumns.from_json(self.raw['sentences'])
+        return self._tokens
+
+    @property
+    def dependencies(self) -> DependencyColumns:
+        if self._dependencies is None and self.load_dependencies and self.raw is not None:
+            self._dependencies = DependencyColumns.from_json(self.raw['sentences'], len(self.tokens))
+        return self._dependencies
+
+    @property
+    def relations(self) -> RelationColumns:
+        if self._relations is None and self.load_relations and self.raw is not None:
+            self._relations = RelationColumns.from_json(self.raw.get('relations', []))
+        return self._relations
+
+    @staticmethod
+    def read_parsetree(sent: dict) -> Optional[str]:
+        return sent.get('parsetree') or (None if sent.get('ptree') else "")
+
+    @staticmethod
+    def read_tree(sent: dict) -> Optional[ConstituencyTree]:
+        return ConstituencyTree.from_json(sent['ptree']) if sent.get('ptree') else None
+
+    @property
+    def parsetrees(self) -> List[Optional[str]]:
+        if self._parsetrees is None:
+            if self.raw is not None:
+                self._parsetrees = [self.read_parsetree(sent) for sent in self.raw['sentences']]
+            else:
+                self._parsetrees = [""] * self.tokens.get_sentence_count()
+        return self._parsetrees
+
+    @property
+    def trees(self) -> List[Optional[ConstituencyTree]]:
+        if self._trees is None:
+            if self.raw is not None:
+                self._trees = [self.read_tree(sent) for sent in self.raw['sentences']]
+            else:
+                self._trees = [None] * self.tokens.get_sentence_count()
+        return self._trees
+
+    def get_parsetree(self, sent_i: int) -> Optional[str]:
+        if self._parsetrees is None and self.raw is not None:
+            return self.read_parsetree(self.raw['sentences'][sent_i])
+        return self.parsetrees[sent_i]
+
+    def get_tree(self, sent_i: int) -> Optional[ConstituencyTree]:
+        if self._trees is None and self.raw is not None:
+            return self.read_tree(self.raw['sentences'][sent_i])
+        return self.trees[sent_i]
+
+    def get_dependencies(self, sent_i: int, sent_words: List[Token]) -> List[DepRel]:
+        if self.dependencies is None:
+            return []
+        token_range = self.tokens.get_sentence_range(sent_i)
+        heads = self.dependencies.head[token_range.start:token_range.stop].tolist()
+        rels = self.dependencies.deprel[token_range.start:token_range.stop].tolist()
+        return [
+            DepRel(rel=STRINGS[r], head=sent_words[h] if h > 0 else None, dep=sent_words[t_i])
+            for t_i, (h, r) in enumerate(zip(heads, rels)) if h != NO_HEAD
+        ]
+
+    def get_dependency_heads(self, sent_i: int) -> Tuple[np.ndarray, np.ndarray]:
+        # local head index (-1 for roots) and deprel id of each token, as get_dependencies would create them
+        token_range = self.tokens.get_sentence_range(sent_i)
+        if self.dependencies is None:
+            return np.full(len(token_range), -1, dtype=np.int32), np.zeros(len(token_range), dtype=np.int32)
+        heads = self.dependencies.head[token_range.start:token_range.stop]
+        return np.where(heads > 0, heads, -1), self.dependencies.deprel[token_range.start:token_range.stop]
+
+    def get_sentences(self, tokens: List[Token] = None) -> List[Sentence]:
+        tokens = tokens if tokens is not None else self.tokens.get_tokens()
+        sents = []
+        for sent_i in range(self.tokens.get_sentence_count()):
+            token_range = self.tokens.get_sentence_range(sent_i)
+            sents.append(Sentence(tokens[token_range.start:token_range.stop], parsetree=self.get_parsetree(sent_i),
+                                  tree=self.get_tree(sent_i), columns=self, sent_idx=sent_i))
+        return sents
+
+    def get_relations(self, tokens: List[Token]) -> List[Relation]:
+        if self.relations is None:
+            return []
+        return [
+            Relation([tokens[i] for i in self.relations.get_part(rel_i, RelationColumns.ARG1).tolist()],
+                     [tokens[i] for i in self.relations.get_part(rel_i, RelationColumns.ARG2).tolist()],
+                     [tokens[i] for i in self.relations.get_part(rel_i, RelationColumns.CONN).tolist()],
+                     self.relations.senses[rel_i], self.relations.types[rel_i])
+            for rel_i in range(len(self.relations))
+        ]
+
+    def dependencies_to_json(self, sent_i: int) -> List[dict]:
+        if self.dependencies is None:
+            return []
+        return self.dependencies.to_json(self.tokens.get_sentence_range(sent_i))
+
+    def sentence_to_json(self, sent_i: int, tree_format='string') -> dict:
+        return {
+            'dependencies': self.dependencies_to_json(sent_i),
+            **get_tree_json(self.get_parsetree(sent_i), self.get_tree(sent_i), tree_format),
+            'tokens': self.tokens.tokens_to_json(self.tokens.get_sentence_range(sent_i))
+        }
+
+    def get_character_spans(self, indices: List[int]) -> List[tuple]:
+        # runs of consecutive token indices, plain lists are faster than numpy for these short parts
+        if not indices:
+            return []
+        begins, ends = self.tokens.offset_begin, self.tokens.offset_end
+        spans = []
+        start = prev = indices[0]
+        for i in indices[1:]:
+            if i != prev + 1:
+                spans.append((int(begins[start]), int(ends[prev])))
+                start = i
+            prev = i
+        spans.append((int(begins[start]), int(ends[prev])))
+        return spans
+
+    def relation_to_json(self, doc_id, rel_i: int) -> dict:
+        parts = {}
+        for name, part in (('Arg1', RelationColumns.ARG1), ('Arg2', RelationColumns.ARG2),
+                           ('Connective', RelationColumns.CONN)):
+            indices = self.relations.get_part(rel_i, part).tolist()
+            parts[name] = {'CharacterSpanList': self.get_character_spans(indices),
+                           'RawText': ' '.join([self.tokens.surfaces[i] for i in indices]),
+                           'TokenList': indices}
+        parts.update({
+            'DocID': doc_id,
+            'ID': rel_i,
+            'Sense': self.relations.senses[rel_i],
+            'Type': self.relations.types[rel_i]
+        })
+        return parts
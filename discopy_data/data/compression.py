@@ -0,0 +1,182 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional
+
+COMPRESSORS = {
+    '.gz': gzip,
+    '.bz2': bz2,
+    '.xz': lzma,
+}
+# uncompressed size of the independently compressed members written by BlockWriter
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def get_compressor(path: str):
+    return COMPRESSORS.get(os.path.splitext(path)[1])
+
+
+def get_block_index_path(path: str) -> str:
+    return path + '.blocks'
+
+
+def open_file(path: str, mode: str = 'r', workers: Optional[int] = None):
+    # text or binary file, compressed according to the file extension, '-' is stdin or stdout
+    binary = 'b' in mode
+    if path == '-':
+        stream = sys.stdout if 'w' in mode or 'a' in mode else sys.stdin
+        return stream.buffer if binary else stream
+    compressor = get_compressor(path)
+    if compressor is None:
+        return open(path, mode) if binary else open(path, mode, encoding='utf8')
+    if 'w' in mode:
+        writer = BlockWriter(path, workers=workers)
+        return writer if binary else io.TextIOWrapper(writer, encoding='utf8', write_through=True)
+    return compressor.open(path, mode if binary else mode.replace('t', '') + 't', encoding=None if binary else 'utf8')
+
+
+def compress(compressor, data: bytes) -> bytes:
+    if compressor is gzip:
+        return gzip.compress(data, compresslevel=6)
+    return compressor.compress(data)
+
+
+class BlockIndex:
+
+    def __init__(self, compressed: List[int], uncompressed: List[int]):
+        # start offset of each member in the compressed file and of its content in the uncompressed stream
+        self.compressed: List[int] = compressed
+        self.uncompressed: List[int] = uncompressed
+
+    @staticmethod
+    def load(path: str) -> Optional['BlockIndex']:
+        index_path = get_block_index_path(path)
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+            return None
+        with open(index_path) as fh:
+            index = json.load(fh)
+        return BlockIndex(index['compressed'], index['uncompressed'])
+
+    def save(self, path: str):
+        with open(get_block_index_path(path), 'w') as fh:
+            json.dump({'compressed': self.compressed, 'uncompressed': self.uncompressed}, fh)
+
+    def find(self, offset: int) -> int:
+        # last block starting at or before the uncompressed offset
+        lo, hi = 0, len(self.uncompressed)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.uncompressed[mid] <= offset:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+
+class BlockWriter(io.RawIOBase):
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE, workers: Optional[int] = None):
+        # data is cut into blocks which are compressed as separate members on a thread pool and written in order,
+        # the compressors release the GIL so the pipeline writing into this file is not slowed down
+        self.path = path
+        self.compressor = get_compressor(path)
+        self.fh: BinaryIO = open(path, 'wb')
+        self.block_size = block_size
+        workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(workers)
+        self.max_pending = 2 * workers
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.index = BlockIndex([], [])
+        self.compressed_size = 0
+        self.uncompressed_size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self.buffer.extend(data)
+        if len(self.buffer) >= self.block_size:
+            # blocks end at a line break, so each block starts with a complete record
+            end = self.buffer.rfind(b'\n', 0, len(self.buffer)) + 1 or len(self.buffer)
+            self.submit(bytes(self.buffer[:end]))
+            del self.buffer[:end]
+        return len(data)
+
+    def submit(self, block: bytes):
+        self.index.uncompressed.append(self.uncompressed_size)
+        self.uncompressed_size += len(block)
+        self.pending.append(self.pool.submit(compress, self.compressor, block))
+        while len(self.pending) > self.max_pending or (self.pending and self.pending[0].done()):
+            self.write_block(self.pending.popleft().result())
+
+    def write_block(self, data: bytes):
+        self.index.compressed.append(self.compressed_size)
+        self.compressed_size += len(data)
+        self.fh.write(data)
+
+    def flush(self):
+        # only finished blocks are written, partial blocks wait for more data to keep the compression ratio
+        while self.pending and self.pending[0].done():
+            self.write_block(self.pending.popleft().result())
+        if not self.fh.closed:
+            self.fh.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer or not self.index.uncompressed:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.write_block(self.pending.popleft().result())
+        self.pool.shutdown()
+        self.fh.close()
+        self.index.save(self.path)
+        super().close()
+
+
+class BlockReader:
+
+    def __init__(self, path: str):
+        # random access reads of the uncompressed content, decompression starts at the closest indexed block
+        self.path = path
+        self.compressor = get_compressor(path)
+        self.index = BlockIndex.load(path) if self.compressor is not None else None
+        self.fh: BinaryIO = open(path, 'rb')
+        self.stream: Optional[BinaryIO] = None
+        # uncompressed offset the current stream started at
+        self.base = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def seek(self, offset: int):
+        if self.compressor is None:
+            self.fh.seek(offset)
+            self.stream = self.fh
+            return
+        block = self.index.find(offset) if self.index is not None else 0
+        position = self.base + self.stream.tell() if self.stream is not None else -1
+        if self.stream is None or offset < position or (self.index is not None and block > self.index.find(position)):
+            self.fh.seek(self.index.compressed[block] if self.index is not None else 0)
+            self.stream = self.compressor.open(self.fh, 'rb')
+            self.base = self.index.uncompressed[block] if self.index is not None else 0
+        # moving forward within a block decompresses the data in between
+        self.stream.seek(offset - self.base)
+
+    def read(self, offset: int, length: int) -> bytes:
+        self.seek(offset)
+        return self.stream.read(length)
+
+    def close(self):
+        self.fh.close()
@@ -0,0 +1,126 @@
+from typing import List
+
+import numpy as np
+
+from .strings import STRINGS
+
+
+class DependencyGraph:
+
+    def __init__(self, heads: np.ndarray, deprels: np.ndarray):
+        n = len(heads)
+        heads = [h if 0 <= h < n else -1 for h in np.asarray(heads).tolist()]
+        # local index of the head of each token, -1 for roots
+        self.heads: np.ndarray = np.array(self.break_cycles(heads), dtype=np.int32)
+        # ids into STRINGS
+        self.deprels: np.ndarray = np.asarray(deprels, dtype=np.int32)
+        # all roots hang below a virtual root with index n
+        parents = np.where(self.heads >= 0, self.heads, n)
+        self.child_ptr: np.ndarray = np.zeros(n + 2, dtype=np.int32)
+        np.cumsum(np.bincount(parents, minlength=n + 1), out=self.child_ptr[1:])
+        self.child_idx: np.ndarray = np.argsort(parents, kind='stable').astype(np.int32)
+        self.build_euler_tour()
+
+    @staticmethod
+    def from_dependencies(dependencies: list, n_tokens: int) -> 'DependencyGraph':
+        heads = np.full(n_tokens, -1, dtype=np.int32)
+        deprels = np.zeros(n_tokens, dtype=np.int32)
+        for d in dependencies:
+            heads[d.dep.local_idx] = d.head.local_idx if d.head else -1
+            deprels[d.dep.local_idx] = STRINGS.add(d.rel)
+        return DependencyGraph(heads, deprels)
+
+    @staticmethod
+    def break_cycles(heads: List[int]) -> List[int]:
+        # tokens on a cycle of head links become roots, 0 unseen, 1 on the current path, 2 done
+        state = [0] * len(heads)
+        for start in range(len(heads)):
+            path = []
+            node = start
+            while node >= 0 and state[node] == 0:
+                state[node] = 1
+                path.append(node)
+                node = heads[node]
+            if node >= 0 and state[node] == 1:
+                heads[node] = -1
+            for p in path:
+                state[p] = 2
+        return heads
+
+    def build_euler_tour(self):
+        n = len(self.heads)
+        euler, first = [], [0] * (n + 1)
+        depth = [0] * (n + 1)
+        depth[n] = -1
+        stack = [(n, 0)]
+        while stack:
+            node, child_i = stack.pop()
+            if child_i == 0:
+                first[node] = len(euler)
+            euler.append(node)
+            begin, end = self.child_ptr[node], self.child_ptr[node + 1]
+            if begin + child_i < end:
+                child = int(self.child_idx[begin + child_i])
+                depth[child] = depth[node] + 1
+                stack.append((node, child_i + 1))
+                stack.append((child, 0))
+        self.depth: np.ndarray = np.array(depth[:n], dtype=np.int32)
+        self.euler: np.ndarray = np.array(euler, dtype=np.int32)
+        self.euler_depth: np.ndarray = np.array(depth, dtype=np.int32)[self.euler]
+        self.first: np.ndarray = np.array(first, dtype=np.int32)
+        # sparse table of positions with minimal depth within euler[i:i + 2 ** k]
+        m = len(self.euler)
+        levels = max(1, int(m).bit_length())
+        self.min_table: np.ndarray = np.tile(np.arange(m, dtype=np.int32), (levels, 1))
+        for k in range(1, levels):
+            step = 1 << (k - 1)
+            left, right = self.min_table[k - 1, :m - step], self.min_table[k - 1, step:]
+            self.min_table[k, :m - step] = np.where(self.euler_depth[left] <= self.euler_depth[right], left, right)
+
+    def __len__(self):
+        return len(self.heads)
+
+    def get_label(self, token: int) -> str:
+        return STRINGS[self.deprels[token]]
+
+    def get_children(self, token: int) -> np.ndarray:
+        return self.child_idx[self.child_ptr[token]:self.child_ptr[token + 1]]
+
+    def get_roots(self) -> np.ndarray:
+        return self.get_children(len(self.heads))
+
+    def get_lca(self, a, b) -> np.ndarray:
+        # lowest common ancestor of each pair of tokens, -1 for tokens in different trees
+        a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+        lo = np.minimum(self.first[a], self.first[b])
+        hi = np.maximum(self.first[a], self.first[b]) + 1
+        k = np.log2(hi - lo).astype(np.int64)
+        left, right = self.min_table[k, lo], self.min_table[k, hi - (1 << k)]
+        lca = np.where(self.euler_depth[left] <= self.euler_depth[right], self.euler[left], self.euler[right])
+        return np.where(lca == len(self.heads), -1, lca)
+
+    def get_distances(self, a, b) -> np.ndarray:
+        # number of edges between each pair of tokens, trees of a forest are joined by the virtual root
+        lca = self.get_lca(a, b)
+        lca_depth = np.where(lca >= 0, self.depth[lca], -1)
+        return self.depth[a] + self.depth[b] - 2 * lca_depth
+
+    def get_paths_to_root(self, tokens) -> List[np.ndarray]:
+        tokens = np.asarray(tokens, dtype=np.int64)
+        # heads[-1] is -1, so finished paths stay at -1
+        heads = np.append(self.heads, -1)
+        steps = [tokens]
+        for _ in range(int(self.depth[tokens].max(initial=0))):
+            steps.append(heads[steps[-1]])
+        steps = np.stack(steps, axis=1)
+        return [steps[i, :d + 1] for i, d in enumerate(self.depth[tokens].tolist())]
+
+    def get_paths(self, a, b) -> List[np.ndarray]:
+        # tokens on the path from a up to the lowest common ancestor and down to b
+        a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+        lca = self.get_lca(a, b)
+        lca_depth = np.where(lca >= 0, self.depth[lca], -1)
+        up_paths, down_paths = self.get_paths_to_root(a), self.get_paths_to_root(b)
+        # with lca depth -1 (different trees) both paths are kept completely
+        return [np.concatenate([up[:len(up) - d], down[:len(down) - d - 1][::-1]])
+                for up, down, d in zip(up_paths, down_paths, lca_depth.tolist())]
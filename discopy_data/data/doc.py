@@ -1,79 +1,197 @@
 import json
-from typing import List
+from collections import defaultdict
+from typing import List, Sequence, Tuple
 
 import numpy as np
 
+from .columns import DocumentColumns, RelationColumns
+from .embeddings import EmbeddingBuffer
+from .offsets import OffsetIndex, Span
+from .quantization import Embeddings, concatenate, dequantize
 from .relation import Relation
-from .sentence import Sentence, DepRel
+from .sentence import Sentence
 from .token import Token
 
 
 class Document:
-    def __init__(self, doc_id, sentences: List[Sentence], relations: List[Relation], meta: dict = None):
+    def __init__(self, doc_id, sentences: List[Sentence] = None, relations: List[Relation] = None, meta: dict = None,
+                 columns: DocumentColumns = None):
         self.doc_id = doc_id
         self.meta = meta or {}
-        self.sentences: List[Sentence] = sentences
-        self.relations: List[Relation] = relations
-        self.text = '\n'.join([s.get_text() for s in self.sentences])
+        # column backed documents create their token, sentence, and relation objects on first access
+        self.columns: DocumentColumns = columns
+        if columns is None:
+            sentences = sentences or []
+            relations = relations or []
+        self._sentences: List[Sentence] = sentences
+        self._relations: List[Relation] = relations
+        self._text: str = None
+        self._tokens: List[Token] = None
+        self._offset_index: OffsetIndex = None
+        self._embedding_buffer: EmbeddingBuffer = None
 
-    def to_json(self):
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            if self._sentences is None:
+                self._text = self.columns.tokens.get_text()
+            else:
+                self._text = '\n'.join([s.get_text() for s in self._sentences])
+        return self._text
+
+    @text.setter
+    def text(self, text: str):
+        self._text = text
+
+    @property
+    def sentences(self) -> List[Sentence]:
+        if self._sentences is None:
+            self._sentences = self.columns.get_sentences()
+        return self._sentences
+
+    @sentences.setter
+    def sentences(self, sentences: List[Sentence]):
+        self._sentences = sentences
+        self._tokens = None
+        self._offset_index = None
+        self._embedding_buffer = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.get_embedding_buffer().embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings: Embeddings):
+        # the document owns one embedding matrix for all tokens, sentence embeddings are views of it
+        buffer = EmbeddingBuffer(embeddings)
+        buffer.attach(self.sentences)
+        self._embedding_buffer = buffer
+
+    def get_embedding_buffer(self) -> EmbeddingBuffer:
+        if self._embedding_buffer is None or not self._embedding_buffer.valid:
+            # embeddings were assigned per sentence, they are copied into a new buffer once
+            if any(s.embeddings is None for s in self.sentences):
+                raise ValueError("Embeddings not found.")
+            self.embeddings = concatenate([s.embeddings for s in self.sentences])
+        return self._embedding_buffer
+
+    @property
+    def relations(self) -> List[Relation]:
+        if self._relations is None:
+            self._relations = self.columns.get_relations(self.get_tokens())
+        return self._relations
+
+    @relations.setter
+    def relations(self, relations: List[Relation]):
+        self._relations = relations
+
+    def to_json(self, tree_format='string'):
+        # tree_format selects the bracketed parse tree string, the array encoded tree, or both
+        if self._sentences is None:
+            sentences = [self.columns.sentence_to_json(sent_i, tree_format)
+                         for sent_i in range(self.columns.tokens.get_sentence_count())]
+        else:
+            sentences = [s.to_json(tree_format) for s in self._sentences]
+        if self._relations is None:
+            relations = [self.columns.relation_to_json(self.doc_id, r_i) for r_i in range(len(self.columns.relations))]
+        else:
+            relations = [r.to_json(self.doc_id, rel_id=r_i) for r_i, r in enumerate(self._relations)]
         return {
             'docID': self.doc_id,
             'meta': self.meta,
             'text': self.text,
-            'sentences': [s.to_json() for s in self.sentences],
-            'relations': [r.to_json(self.doc_id, rel_id=r_i) for r_i, r in enumerate(self.relations)]
+            'sentences': sentences,
+            'relations': relations
         }
 
     @staticmethod
-    def from_json(doc: dict, load_dependencies=True, load_relations=True):
-        words = []
-        token_offset = 0
-        sents = []
-        for sent_i, sent in enumerate(doc['sentences']):
-            sent_words = [
-                Token(token_offset + w_i, sent_i, w_i, t['characterOffsetBegin'], t['characterOffsetEnd'], t['surface'],
-                      upos=t.get('upos', ""), xpos=t.get('xpos', ""), lemma=t.get('lemma', ""))
-                for w_i, t in enumerate(sent['tokens'])
-            ]
-            words.extend(sent_words)
-            token_offset += len(sent_words)
-            if load_dependencies:
-                dependencies = [
-                    DepRel(rel=t['deprel'],
-                           head=sent_words[int(t['head'])] if t['head'] > 0 else None,
-                           dep=sent_words[t_i]
-                           ) for t_i, t in enumerate(sent.get('dependencies', []))
-                ]
+    def from_json(doc: dict, load_dependencies=True, load_relations=True, lazy=False):
+        # lazy keeps the json dict and decodes each layer (tokens, dependencies, parse trees, relations, text)
+        # when it is first accessed
+        columns = DocumentColumns.from_json(doc, load_dependencies=load_dependencies, load_relations=load_relations,
+                                            lazy=lazy)
+        return Document(doc_id=doc['docID'], relations=None if load_relations else [], meta=doc.get('meta'),
+                        columns=columns)
+
+    def get_columns(self) -> DocumentColumns:
+        # columns reflecting the current state, rebuilt if tokens, sentences or relations were created
+        if self.columns is not None and self._sentences is None and self._relations is None:
+            self.columns.decode()
+            return self.columns
+        return DocumentColumns.from_json(self.to_json())
+
+    def get_tokens(self) -> List[Token]:
+        if self._tokens is None:
+            self._tokens = [token for sent in self.sentences for token in sent.tokens]
+        return self._tokens
+
+    def get_offset_index(self) -> OffsetIndex:
+        if self._offset_index is None:
+            if self._sentences is None:
+                self._offset_index = OffsetIndex(self.columns.tokens.offset_begin, self.columns.tokens.offset_end)
             else:
-                dependencies = []
-            sents.append(Sentence(sent_words, dependencies=dependencies, parsetree=sent.get('parsetree')))
-        if load_relations:
-            relations = [
-                Relation([words[i] for i in rel['Arg1']['TokenList']],
-                         [words[i] for i in rel['Arg2']['TokenList']],
-                         [words[i] for i in rel['Connective']['TokenList']],
-                         rel['Sense'], rel['Type'])
-                for rel in doc.get('relations', [])
-            ]
-        else:
-            relations = []
-        return Document(doc_id=doc['docID'], sentences=sents, relations=relations, meta=doc.get('meta'))
+                tokens = self.get_tokens()
+                self._offset_index = OffsetIndex(np.fromiter((t.offset_begin for t in tokens), int, len(tokens)),
+                                                 np.fromiter((t.offset_end for t in tokens), int, len(tokens)))
+        return self._offset_index
+
+    def get_overlapping_tokens(self, span_lists: Sequence[Sequence[Span]]) -> List[List[Token]]:
+        tokens = self.get_tokens()
+        return [[tokens[i] for i in ids.tolist()] for ids in self.get_offset_index().get_overlapping(span_lists)]
 
-    def get_tokens(self):
-        return [token for sent in self.sentences for token in sent.tokens]
+    def get_starting_tokens(self, span_lists: Sequence[Sequence[Span]]) -> List[List[Token]]:
+        tokens = self.get_tokens()
+        return [[tokens[i] for i in ids.tolist()] for ids in self.get_offset_index().get_starting(span_lists)]
+
+    def get_relation_indices(self) -> Tuple[List[List[np.ndarray]], List[str], List[List[str]]]:
+        # sorted token indices of arg1, arg2, and conn for all relations, plus their types and senses
+        if self._relations is None:
+            rels = self.columns.relations
+            parts = [[np.unique(rels.get_part(r_i, part)) for r_i in range(len(rels))]
+                     for part in (RelationColumns.ARG1, RelationColumns.ARG2, RelationColumns.CONN)]
+            return parts, rels.types, rels.senses
+        parts = [[r.arg1.indices for r in self._relations],
+                 [r.arg2.indices for r in self._relations],
+                 [r.conn.indices for r in self._relations]]
+        return parts, [r.type for r in self._relations], [r.senses for r in self._relations]
 
     def get_embeddings(self) -> np.array:
-        return np.concatenate([s.get_embeddings() for s in self.sentences], axis=0)
+        return dequantize(self.embeddings)
 
     def get_embedding_dim(self) -> int:
+        if self._embedding_buffer is not None and self._embedding_buffer.valid:
+            return int(self._embedding_buffer.embeddings.shape[-1])
         return int(self.sentences[0].embeddings.shape[-1])
 
     def with_relations(self, relations):
-        return Document(self.doc_id, self.sentences, relations, meta=self.meta)
+        doc = Document(self.doc_id, self.sentences, relations, meta=self.meta, columns=self.columns)
+        doc._tokens = self._tokens
+        doc._offset_index = self._offset_index
+        doc._embedding_buffer = self._embedding_buffer
+        return doc
 
     def __str__(self):
         return json.dumps(self.to_json(), indent=2)
 
     def get_explicit_relations(self):
         return [r for r in self.relations if r.is_explicit()]
+
+    def get_connective_constituents(self, relations: List[Relation] = None) -> List[Tuple[int, int]]:
+        # sentence and lowest constituent covering the connective of each relation (explicit ones by default),
+        # only connective tokens within the sentence of the first one count, -1 where either is missing
+        relations = self.get_explicit_relations() if relations is None else relations
+        constituents = [(-1, -1)] * len(relations)
+        spans = defaultdict(list)
+        for r_i, rel in enumerate(relations):
+            if not rel.conn.tokens:
+                continue
+            sent_idx = rel.conn.tokens[0].sent_idx
+            local_idxs = [t.local_idx for t in rel.conn.tokens if t.sent_idx == sent_idx]
+            spans[sent_idx].append((r_i, min(local_idxs), max(local_idxs) + 1))
+        for sent_idx, sent_spans in spans.items():
+            tree = self.sentences[sent_idx].get_tree()
+            rel_idxs, begins, ends = zip(*sent_spans)
+            nodes = tree.get_covering_nodes(begins, ends).tolist() if tree else [-1] * len(rel_idxs)
+            for r_i, node in zip(rel_idxs, nodes):
+                constituents[r_i] = (sent_idx, node)
+        return constituents
@@ -0,0 +1,309 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from discopy_data.data.quantization import Embeddings, QuantizedEmbeddings, quantize
+
+DATA = 'embeddings.bin'
+SCALES = 'scales.bin'
+INDEX = 'index.jsonl'
+META = 'meta.json'
+LOCK = 'lock'
+SENTENCES = 'sentences.sqlite'
+
+
+class EmbeddingStore:
+
+    def __init__(self, path: str, dim: Optional[int] = None, dtype='float32', writable=False, meta: dict = None):
+        # one float matrix of shape (rows, dim) with the token embeddings of all documents next to each other,
+        # the index maps each docID to its first row and number of rows, dtype is float32, float16, or int8
+        # with one scale per dimension and index entry, an entry may carry a digest of the document content and
+        # a later entry for the same docID replaces the earlier one
+        # any number of processes may read while writers append, writers hold an exclusive lock for each append
+        self.path = path
+        self.writable = writable
+        meta_path = os.path.join(path, META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as fh:
+                self.meta: dict = json.load(fh)
+            if dim is not None and dim != self.meta['dim']:
+                raise ValueError(f"Store has dimension {self.meta['dim']}, got {dim}.")
+        elif writable:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'dim': dim, 'dtype': np.dtype(dtype).name, **(meta or {})}
+            if dim is not None:
+                self.save_meta()
+        else:
+            raise FileNotFoundError(f'No embedding store at {path}.')
+        self.index: Dict[str, Tuple[int, int, int, str]] = {}
+        self.rows = 0
+        self.entries = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self.load_index()
+        if writable:
+            with self.locked():
+                self.reload()
+                self.truncate()
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, META))
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.meta['dim']
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.meta['dtype'])
+
+    def save_meta(self):
+        with open(os.path.join(self.path, META), 'w') as fh:
+            json.dump(self.meta, fh)
+
+    @contextlib.contextmanager
+    def locked(self):
+        # exclusive lock shared by all writers of the store
+        with open(os.path.join(self.path, LOCK), 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def reload(self):
+        # meta data and index as written by other processes
+        meta_path = os.path.join(self.path, META)
+        if os.path.exists(meta_path):
+            with open(meta_path) as fh:
+                self.meta = json.load(fh)
+        self.load_index()
+
+    def load_index(self):
+        # entries are only written after their rows, a cut off last line stems from an interrupted append
+        self.index, self.rows, self.entries = {}, 0, 0
+        index_path = os.path.join(self.path, INDEX)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path) as fh:
+            for line in fh:
+                if not line.endswith('\n'):
+                    break
+                # entries written before digests were recorded have three fields
+                doc_id, offset, rows, *digest = json.loads(line)
+                self.index[doc_id] = (offset, rows, self.entries, digest[0] if digest else '')
+                self.rows = max(self.rows, offset + rows)
+                self.entries += 1
+        self._matrix, self._scales = None, None
+
+    @property
+    def quantized(self) -> bool:
+        return self.dtype == np.int8
+
+    def truncate(self):
+        # drop rows and index lines of an interrupted append, so appending can resume, only called with the lock
+        data_path = os.path.join(self.path, DATA)
+        if self.dim is not None and os.path.exists(data_path):
+            with open(data_path, 'r+b') as fh:
+                fh.truncate(self.rows * self.dim * self.dtype.itemsize)
+        scales_path = os.path.join(self.path, SCALES)
+        if self.dim is not None and os.path.exists(scales_path):
+            with open(scales_path, 'r+b') as fh:
+                fh.truncate(self.entries * self.dim * 4)
+        index_path = os.path.join(self.path, INDEX)
+        if os.path.exists(index_path):
+            with open(index_path) as fh:
+                lines = fh.readlines()
+            if len(lines) != self.entries:
+                with open(index_path, 'w') as fh:
+                    fh.writelines(lines[:self.entries])
+
+    def refresh(self):
+        # readers pick up documents appended since they opened the store
+        self.load_index()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if self.rows == 0:
+                self._matrix = np.zeros((0, self.dim or 0), dtype=self.dtype)
+            else:
+                self._matrix = np.memmap(os.path.join(self.path, DATA), dtype=self.dtype, mode='r',
+                                         shape=(self.rows, self.dim))
+        return self._matrix
+
+    @property
+    def scales(self) -> np.ndarray:
+        if self._scales is None:
+            self._scales = np.memmap(os.path.join(self.path, SCALES), dtype=np.float32, mode='r',
+                                     shape=(self.entries, self.dim))
+        return self._scales
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.index
+
+    def get_doc_ids(self) -> List[str]:
+        return list(self.index)
+
+    def get_digest(self, doc_id: str) -> str:
+        return self.index[doc_id][3]
+
+    def get(self, doc_id: str) -> Embeddings:
+        # read-only view into the mapped file, no data is copied
+        offset, rows, entry_i, _ = self.index[doc_id]
+        if self.quantized:
+            return QuantizedEmbeddings(self.matrix[offset:offset + rows], self.scales[entry_i])
+        return self.matrix[offset:offset + rows]
+
+    def is_stored(self, doc_id: str, digest: str = '') -> bool:
+        return doc_id in self.index and self.index[doc_id][3] == digest
+
+    def append(self, doc_id: str, embeddings: np.ndarray, digest: str = ''):
+        # a document stored with another digest is replaced, its old rows stay in the file unused
+        if not self.writable:
+            raise ValueError('Embedding store is opened read-only.')
+        if self.is_stored(doc_id, digest):
+            raise ValueError(f'Embeddings of {doc_id} are already stored.')
+        with self.locked():
+            # rows and index lines appended by other writers since the last append
+            self.reload()
+            self.truncate()
+            # another writer may have stored the same document in the meantime
+            if not self.is_stored(doc_id, digest):
+                self.append_locked(doc_id, embeddings, digest)
+
+    def append_locked(self, doc_id: str, embeddings: np.ndarray, digest: str):
+        if len(embeddings) == 0:
+            # empty documents take no rows, only their index entry and, for int8, a scale row
+            if self.dim is None:
+                raise ValueError(f'Cannot store the empty document {doc_id} before the dimension is known.')
+            embeddings = np.zeros((0, self.dim), dtype=np.float32)
+        embeddings = quantize(embeddings, self.dtype.name)
+        if self.dim is None:
+            self.meta['dim'] = int(embeddings.shape[1])
+            self.save_meta()
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f'Store has dimension {self.dim}, got {embeddings.shape[1]}.')
+        if self.quantized:
+            self.write(SCALES, embeddings.scale)
+            self.write(DATA, embeddings.values)
+        else:
+            self.write(DATA, embeddings)
+        with open(os.path.join(self.path, INDEX), 'a') as fh:
+            fh.write(json.dumps([doc_id, self.rows, len(embeddings), digest]) + '\n')
+        self.index[doc_id] = (self.rows, len(embeddings), self.entries, digest)
+        self.rows += len(embeddings)
+        self.entries += 1
+        self._matrix, self._scales = None, None
+
+    def write(self, name: str, array: np.ndarray):
+        with open(os.path.join(self.path, name), 'ab') as fh:
+            fh.write(np.ascontiguousarray(array).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def extend(self, items: Iterable[Tuple[str, np.ndarray]]):
+        for doc_id, embeddings in items:
+            self.append(doc_id, embeddings)
+
+
+class EmbeddingBuffer:
+
+    def __init__(self, embeddings: Embeddings):
+        # contiguous embeddings of a document, invalid once a sentence gets embeddings of its own
+        self.embeddings: Embeddings = embeddings
+        self.valid = True
+
+    def attach(self, sentences):
+        # sentence embeddings become views of the buffer
+        bounds = np.cumsum([0] + [len(sent.tokens) for sent in sentences]).tolist()
+        if bounds[-1] != len(self.embeddings):
+            raise ValueError(f'Got embeddings for {len(self.embeddings)} tokens, expected {bounds[-1]}.')
+        for sent, begin, end in zip(sentences, bounds[:-1], bounds[1:]):
+            sent.embeddings = self.embeddings[begin:end]
+            sent._embedding_buffer = self
+
+
+def get_document_key(sentences: List[List[str]]) -> str:
+    # digest of the token surfaces of a document, any edit of its tokens changes it
+    return hashlib.sha1(json.dumps(sentences).encode('utf8')).hexdigest()
+
+
+def get_sentence_key(config: dict, surfaces: List[str]) -> str:
+    # stable across processes and corpora, equal sentences embedded with the same configuration share a key
+    return hashlib.sha1(json.dumps([config, surfaces], sort_keys=True).encode('utf8')).hexdigest()
+
+
+class SentenceCache:
+
+    def __init__(self, path: str, max_bytes=8 * 2 ** 30):
+        # token embeddings of single sentences keyed by content, least recently used sentences are evicted once
+        # the stored embeddings exceed max_bytes
+        os.makedirs(path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(os.path.join(path, SENTENCES), timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS sentences '
+                        '(key TEXT PRIMARY KEY, shape TEXT, data BLOB, size INTEGER, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS sentences_used ON sentences (used)')
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM sentences').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.db.execute('SELECT 1 FROM sentences WHERE key = ?', (key,)).fetchone() is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self.db.execute('SELECT COALESCE(SUM(size), 0) FROM sentences').fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        keys = list(set(keys))
+        # sqlite limits the number of parameters per statement
+        for i in range(0, len(keys), 512):
+            chunk = keys[i:i + 512]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.db.execute(f'SELECT key, shape, data FROM sentences WHERE key IN ({placeholders})', chunk)
+            for key, shape, data in rows:
+                found[key] = np.frombuffer(data, dtype=np.float32).reshape(json.loads(shape))
+        now = time.time()
+        self.db.executemany('UPDATE sentences SET used = ? WHERE key = ?', [(now, key) for key in found])
+        self.db.commit()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        now = time.time()
+        self.db.executemany('INSERT OR REPLACE INTO sentences VALUES (?, ?, ?, ?, ?)', [
+            (key, json.dumps(embeddings.shape), embeddings.tobytes(), embeddings.nbytes, now)
+            for key, embeddings in ((key, np.ascontiguousarray(e, dtype=np.float32)) for key, e in items.items())
+        ])
+        self.db.commit()
+        self.evict()
+
+    def evict(self):
+        excess = self.nbytes - self.max_bytes
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self.db.execute('SELECT key, size FROM sentences ORDER BY used'):
+            if excess <= 0:
+                break
+            keys.append((key,))
+            excess -= size
+        self.db.executemany('DELETE FROM sentences WHERE key = ?', keys)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
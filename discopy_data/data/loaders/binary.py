@@ -0,0 +1,197 @@
+import json
+import os
+from typing import Iterator, List, Union
+
+import numpy as np
+
+from discopy_data.data.columns import (DependencyColumns, DocumentColumns, NO_HEAD, RelationColumns,
+                                       TokenColumns)
+from discopy_data.data.doc import Document
+from discopy_data.data.strings import STRINGS, StringTable
+
+FORMAT_VERSION = 1
+
+# per token arrays, label arrays hold ids into the label table of the corpus
+TOKEN_ARRAYS = ('offset_begin', 'offset_end', 'upos', 'xpos', 'lemma', 'head', 'deprel')
+# strings of a document (surfaces, parse trees, json record) are joined by this separator
+SEPARATOR = '\x00'
+
+
+class BlobWriter:
+
+    def __init__(self, path: str):
+        self.fh = open(path, 'wb')
+        self.offsets: List[int] = [0]
+
+    def add(self, text: str):
+        data = text.encode('utf8')
+        self.fh.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self) -> np.ndarray:
+        self.fh.close()
+        return np.array(self.offsets, dtype=np.int64)
+
+
+class BinaryCorpusWriter:
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.labels = StringTable([''])
+        self.doc_ids = []
+        self.arrays = {name: [] for name in TOKEN_ARRAYS + ('sent_lengths', 'rel_part_lengths', 'rel_indices')}
+        self.doc_tokens, self.doc_sents, self.doc_rels = [0], [0], [0]
+        self.surfaces = BlobWriter(os.path.join(path, 'surfaces.bin'))
+        self.parsetrees = BlobWriter(os.path.join(path, 'parsetrees.bin'))
+        self.records = BlobWriter(os.path.join(path, 'records.bin'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_label_ids(self, ids: np.ndarray) -> np.ndarray:
+        # process wide string ids to ids into the corpus label table
+        return np.array([self.labels.add(s) for s in STRINGS.decode(ids.tolist())], dtype=np.int32)
+
+    def add(self, doc: Document):
+        columns = doc.get_columns()
+        tokens = columns.tokens
+        deps = columns.dependencies
+        rels = columns.relations
+        self.arrays['offset_begin'].append(tokens.offset_begin.astype(np.int32))
+        self.arrays['offset_end'].append(tokens.offset_end.astype(np.int32))
+        self.arrays['upos'].append(self.get_label_ids(tokens.upos))
+        self.arrays['xpos'].append(self.get_label_ids(tokens.xpos))
+        self.arrays['lemma'].append(self.get_label_ids(tokens.lemma))
+        if deps is not None:
+            self.arrays['head'].append(deps.head.astype(np.int32))
+            self.arrays['deprel'].append(self.get_label_ids(deps.deprel))
+        else:
+            self.arrays['head'].append(np.full(len(tokens), NO_HEAD, dtype=np.int32))
+            self.arrays['deprel'].append(np.zeros(len(tokens), dtype=np.int32))
+        self.arrays['sent_lengths'].append(np.diff(tokens.sent_bounds).astype(np.int32))
+        n_rels = len(rels) if rels is not None else 0
+        if n_rels:
+            self.arrays['rel_part_lengths'].append(np.diff(rels.bounds).astype(np.int32))
+            self.arrays['rel_indices'].append(rels.indices.astype(np.int32))
+        self.surfaces.add(SEPARATOR.join(tokens.surfaces))
+        self.parsetrees.add(SEPARATOR.join(
+            p if p is not None else columns.get_tree(sent_i).to_string()
+            for sent_i, p in enumerate(columns.parsetrees)))
+        self.records.add(json.dumps({
+            'docID': doc.doc_id,
+            'meta': doc.meta,
+            'senses': rels.senses if n_rels else [],
+            'types': rels.types if n_rels else [],
+        }))
+        self.doc_ids.append(doc.doc_id)
+        self.doc_tokens.append(self.doc_tokens[-1] + len(tokens))
+        self.doc_sents.append(self.doc_sents[-1] + tokens.get_sentence_count())
+        self.doc_rels.append(self.doc_rels[-1] + n_rels)
+
+    def close(self):
+        arrays = {name: np.concatenate(values) if values else np.zeros(0, dtype=np.int32)
+                  for name, values in self.arrays.items()}
+        arrays['doc_tokens'] = np.array(self.doc_tokens, dtype=np.int64)
+        arrays['doc_sents'] = np.array(self.doc_sents, dtype=np.int64)
+        arrays['doc_rels'] = np.array(self.doc_rels, dtype=np.int64)
+        arrays['rel_parts'] = np.zeros(len(arrays['rel_part_lengths']) + 1, dtype=np.int64)
+        np.cumsum(arrays['rel_part_lengths'], out=arrays['rel_parts'][1:])
+        del arrays['rel_part_lengths']
+        arrays['surfaces'] = self.surfaces.close()
+        arrays['parsetrees'] = self.parsetrees.close()
+        arrays['records'] = self.records.close()
+        for name, array in arrays.items():
+            np.save(os.path.join(self.path, name + '.npy'), array)
+        with open(os.path.join(self.path, 'header.json'), 'w') as fh:
+            json.dump({'version': FORMAT_VERSION, 'doc_ids': self.doc_ids, 'labels': self.labels.strings}, fh)
+
+
+class BinaryCorpus:
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'header.json')) as fh:
+            header = json.load(fh)
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus format version {header['version']}.")
+        self.doc_ids: List[str] = header['doc_ids']
+        self.doc_index = {doc_id: doc_i for doc_i, doc_id in enumerate(self.doc_ids)}
+        # corpus label ids to process wide string ids
+        self.label_map: np.ndarray = STRINGS.encode(header['labels'])
+        self.arrays = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode='r')
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+        self.blobs = {
+            name: np.memmap(os.path.join(path, name + '.bin'), dtype=np.uint8, mode='r')
+            if os.path.getsize(os.path.join(path, name + '.bin')) else np.zeros(0, dtype=np.uint8)
+            for name in ('surfaces', 'parsetrees', 'records')
+        }
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[Document]:
+        for doc_i in range(len(self)):
+            yield self.get_document(doc_i)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_index
+
+    def __getitem__(self, key: Union[int, str]) -> Document:
+        return self.get_document(key if isinstance(key, int) else self.doc_index[key])
+
+    def get_string(self, name: str, doc_i: int) -> str:
+        offsets = self.arrays[name]
+        return self.blobs[name][offsets[doc_i]:offsets[doc_i + 1]].tobytes().decode('utf8')
+
+    def get_document(self, doc_i: int) -> Document:
+        a = self.arrays
+        token_begin, token_end = int(a['doc_tokens'][doc_i]), int(a['doc_tokens'][doc_i + 1])
+        sent_begin, sent_end = int(a['doc_sents'][doc_i]), int(a['doc_sents'][doc_i + 1])
+        rel_begin, rel_end = int(a['doc_rels'][doc_i]), int(a['doc_rels'][doc_i + 1])
+        record = json.loads(self.get_string('records', doc_i))
+        sent_lengths = a['sent_lengths'][sent_begin:sent_end]
+        sent_bounds = np.zeros(len(sent_lengths) + 1, dtype=np.int64)
+        np.cumsum(sent_lengths, out=sent_bounds[1:])
+        sent_idx = np.repeat(np.arange(len(sent_lengths), dtype=np.int32), sent_lengths)
+        surfaces = self.get_string('surfaces', doc_i).split(SEPARATOR) if token_end > token_begin else []
+        tokens = TokenColumns(
+            surfaces=surfaces,
+            offset_begin=a['offset_begin'][token_begin:token_end],
+            offset_end=a['offset_end'][token_begin:token_end],
+            sent_idx=sent_idx,
+            local_idx=(np.arange(token_end - token_begin) - sent_bounds[sent_idx]).astype(np.int32),
+            upos=self.label_map[a['upos'][token_begin:token_end]],
+            xpos=self.label_map[a['xpos'][token_begin:token_end]],
+            lemma=self.label_map[a['lemma'][token_begin:token_end]],
+            sent_bounds=sent_bounds,
+        )
+        dependencies = DependencyColumns(a['head'][token_begin:token_end],
+                                         self.label_map[a['deprel'][token_begin:token_end]])
+        part_begin, part_end = 3 * rel_begin, 3 * rel_end
+        rel_bounds = np.asarray(a['rel_parts'][part_begin:part_end + 1])
+        relations = RelationColumns(a['rel_indices'][rel_bounds[0]:rel_bounds[-1]], rel_bounds - rel_bounds[0],
+                                    senses=record['senses'], types=record['types'])
+        parsetrees = self.get_string('parsetrees', doc_i).split(SEPARATOR) if sent_end > sent_begin else []
+        columns = DocumentColumns(tokens, dependencies=dependencies, relations=relations, parsetrees=parsetrees,
+                                  trees=[None] * len(parsetrees))
+        return Document(doc_id=record['docID'], meta=record['meta'], columns=columns)
+
+
+def write_documents(path: str, docs) -> int:
+    with BinaryCorpusWriter(path) as writer:
+        for doc in docs:
+            writer.add(doc)
+    return len(writer.doc_ids)
+
+
+def load_documents(path: str, tags: str = '') -> Iterator[Document]:
+    tags = tags.split(',') if tags else []
+    for doc in BinaryCorpus(path):
+        if not tags or doc.meta.get('part', '') in tags:
+            yield doc
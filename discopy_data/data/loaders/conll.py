@@ -10,10 +10,15 @@ from tqdm import tqdm
 
 from discopy_data.data.conn_head_mapper import ConnHeadMapper
 from discopy_data.data.doc import Document
+from discopy_data.data.embeddings import EmbeddingStore, SentenceCache, get_document_key
+from discopy_data.data.quantization import quantize
 from discopy_data.data.relation import Relation
 from discopy_data.data.sentence import DepRel, Sentence
 from discopy_data.data.token import Token
-from discopy_data.nn.bert import simple_map, get_doc_sentence_embeddings
+from discopy_data.data.vectors import get_vector_embeddings, load_vectors
+from discopy_data.nn.bert import LAST_FOUR, LayerPooling, get_corpus_embeddings, get_corpus_vector_embeddings, \
+    simple_map
+from discopy_data.nn.registry import get_model
 
 
 def convert_sense(s, lvl):
@@ -73,70 +78,91 @@ def load_bert_conll_dataset(conll_path: str, simple_connectives=False, limit=0,
     return docs
 
 
-def load_bert_embeddings(docs: List[Document], cache_dir='', bert_model='bert-base-cased') -> List[Document]:
-    if cache_dir and os.path.exists(cache_dir):
+def load_bert_embeddings(docs: List[Document], cache_dir='', bert_model='bert-base-cased',
+                         precision='float32', max_tokens=8192, chunk_size=64, window=None,
+                         stride=None, layer_pooling: LayerPooling = None, pooling='first', sentence_cache='',
+                         sentence_cache_size=8 * 2 ** 30, device='') -> List[Document]:
+    # cache_dir is an embedding store that is appended to document by document, an interrupted run resumes
+    # with the missing documents, a cache file written by joblib is still read
+    # sentence_cache is shared across corpora, documents missing from the store only encode unseen sentences
+    # precision is float32, float16, or int8, reduced precision embeddings are dequantized on access
+    layer_pooling = layer_pooling or LayerPooling(layers=(-2,) if bert_model.startswith('xlm-') else LAST_FOUR)
+    meta = {'model': bert_model, 'layer_pooling': layer_pooling.to_config(), 'pooling': pooling, 'window': window,
+            'stride': stride}
+    if cache_dir and os.path.isfile(cache_dir):
+        store = None
         doc_embeddings = joblib.load(cache_dir)
-        tokenizer = None
-        model = None
-        preloaded = True
     else:
-        from transformers import AutoTokenizer, TFAutoModel
+        # an existing store is opened read-only and only reopened for writing if documents are missing
+        store = None
+        if cache_dir:
+            store = EmbeddingStore(cache_dir) if EmbeddingStore.exists(cache_dir) else \
+                EmbeddingStore(cache_dir, dtype=precision, writable=True, meta=meta)
         doc_embeddings = {}
-        if bert_model.startswith('roberta'):
-            tokenizer = AutoTokenizer.from_pretrained(bert_model, add_prefix_space=True)
-        else:
-            tokenizer = AutoTokenizer.from_pretrained(bert_model)
-        model = TFAutoModel.from_pretrained(bert_model)
-        preloaded = False
-    logging.info(f'Use preloaded embeddings: {preloaded}')
+    if store is not None and any(store.meta.get(key, value) != value for key, value in meta.items()):
+        raise ValueError(f'Embedding store at {cache_dir} was computed with a different configuration.')
+    if store is not None and store.dtype != np.dtype(precision):
+        raise ValueError(f'Embedding store at {cache_dir} has precision {store.dtype.name}, got {precision}.')
+    # documents whose tokens changed since they were stored are computed again, mostly from the sentence cache,
+    # and replace their stored embeddings, entries without a digest are only checked for their number of tokens
+    digests = {doc.doc_id: get_document_key([[t.surface for t in sent.tokens] for sent in doc.sentences])
+               for doc in docs} if store is not None else {}
+    missing = [doc for doc in docs if doc.doc_id not in doc_embeddings and (
+            store is None or doc.doc_id not in store or (
+                store.get_digest(doc.doc_id) != digests[doc.doc_id] if store.get_digest(doc.doc_id)
+                else store.index[doc.doc_id][1] != len(doc.get_tokens())))]
+    logging.info(f'Use preloaded embeddings: {len(docs) - len(missing)} of {len(docs)} documents')
+    if missing:
+        if store is not None and not store.writable:
+            store = EmbeddingStore(cache_dir, writable=True)
+        tokenizer = get_model('tokenizer', bert_model)
+        model = get_model('transformer', bert_model, device)
+        cache = SentenceCache(sentence_cache, sentence_cache_size) if sentence_cache else None
+        # sentences of chunk_size documents are batched together, each chunk is stored before the next one starts
+        for chunk_i in tqdm(range(0, len(missing), chunk_size), desc='Compute Contextualized Embeddings',
+                            mininterval=20, maxinterval=60):
+            chunk = missing[chunk_i:chunk_i + chunk_size]
+            chunk_embeddings = get_corpus_embeddings([doc.sentences for doc in chunk], tokenizer, model,
+                                                     max_tokens=max_tokens, pooling=pooling, window=window,
+                                                     stride=stride, layer_pooling=layer_pooling, cache=cache,
+                                                     cache_config={'model': bert_model})
+            for doc, doc_embedding in zip(chunk, chunk_embeddings):
+                # empty documents are kept in memory until the store knows its dimension
+                if store is not None and (len(doc_embedding) or store.dim is not None):
+                    if not store.is_stored(doc.doc_id, digests[doc.doc_id]):
+                        store.append(doc.doc_id, doc_embedding, digests[doc.doc_id])
+                else:
+                    doc_embeddings[doc.doc_id] = quantize(doc_embedding, precision)
     for doc in tqdm(docs, desc='Load Contextualized Embeddings', mininterval=20, maxinterval=60):
-        if preloaded:
-            doc_embedding = doc_embeddings[doc.doc_id]
-        else:
-            last_hidden_only = bert_model.startswith('xlm-')
-            doc_embedding = get_doc_sentence_embeddings(doc.sentences, tokenizer, model,
-                                                        last_hidden_only=last_hidden_only)
-            doc_embeddings[doc.doc_id] = doc_embedding
-        for sent_i, sent in enumerate(doc.sentences):
-            token_offset = sent.tokens[0].idx
-            embeddings = doc_embedding[token_offset:token_offset + len(sent.tokens)]
-            sent.embeddings = embeddings
-    if cache_dir and not preloaded:
-        joblib.dump(doc_embeddings, cache_dir)
+        doc.embeddings = doc_embeddings[doc.doc_id] if doc.doc_id in doc_embeddings else store.get(doc.doc_id)
     return docs
 
 
 def load_embeddings_conll_dataset(conll_path: str, embedder: 'TokenSentenceEmbedder', simple_connectives=False, limit=0,
                                   sense_level=-1) -> List[Document]:
     docs = load_parsed_conll_dataset(conll_path, simple_connectives, limit, sense_level)
-    for doc in docs:
-        for sent_i, sent in enumerate(doc.sentences):
-            embeddings = embedder.get_sentence_vector_embeddings(sent.tokens)
-            sent.embeddings = embeddings
+    for doc, embeddings in zip(docs, embedder.get_corpus_vector_embeddings(docs)):
+        doc.embeddings = embeddings
     return docs
 
 
 class TokenSentenceEmbedder:
 
     def __init__(self, vector_path):
-        def get_coefs(word, *arr):
-            return word, np.asarray(arr, dtype=np.float32)
-
-        embedding_index = dict(get_coefs(*o.rstrip().rsplit(' ')) for o in open(vector_path, encoding='utf8'))
-        print('Found %s word vectors.' % len(embedding_index))
-        all_embs = np.stack([e for e in embedding_index.values() if len(e) >= 100])
-        self.embedding_index = embedding_index
-        self.mean = all_embs.mean()
-        self.std = all_embs.std()
-        self.embedding_dim = len(next(iter(self.embedding_index.values())))
+        # vector_path is a converted vector store or a text file that is converted once on first use
+        self.embedding_index = load_vectors(vector_path)
+        logging.info(f'Found {len(self.embedding_index)} word vectors.')
+        self.mean = self.embedding_index.mean
+        self.std = self.embedding_index.std
+        self.embedding_dim = self.embedding_index.dim
 
     def get_sentence_vector_embeddings(self, tokens: List[Token]):
-        embeddings = np.random.normal(self.mean, self.std, (len(tokens), self.embedding_dim))
-        for i, tok in enumerate(tokens):
-            tok = simple_map.get(tok.surface, tok.surface).lower()
-            if tok in self.embedding_index:
-                embeddings[i] = self.embedding_index[tok]
-        return embeddings
+        return get_vector_embeddings([simple_map.get(t.surface, t.surface).lower() for t in tokens],
+                                     self.embedding_index, self.mean, self.std)
+
+    def get_corpus_vector_embeddings(self, docs: List[Document]) -> List[np.ndarray]:
+        return get_corpus_vector_embeddings([doc.sentences for doc in docs], self.embedding_index, self.mean,
+                                            self.std, lower=True)
 
 
 def connective_head(pdtb):
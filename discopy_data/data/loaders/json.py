@@ -1,18 +1,172 @@
 import json
-from typing import List, TextIO
+import os
+import random
+from typing import Iterator, List, Sequence, TextIO, Union
 
+import numpy as np
+
+from discopy_data.data.codec import loads
+from discopy_data.data.compression import BlockReader, open_file
 from discopy_data.data.doc import Document
 
+INDEX_VERSION = 1
+
+
+def get_index_path(path: str) -> str:
+    return path + '.idx'
+
+
+class JsonlIndex:
+
+    def __init__(self, offsets: np.ndarray, lengths: np.ndarray, doc_ids: List[str], parts: List[str],
+                 n_tokens: np.ndarray, mtime: int = 0, size: int = 0):
+        # byte offset (in the uncompressed content) and length of each line holding a document
+        self.offsets: np.ndarray = offsets
+        self.lengths: np.ndarray = lengths
+        self.doc_ids: List[str] = doc_ids
+        self.parts: List[str] = parts
+        self.n_tokens: np.ndarray = n_tokens
+        # state of the indexed file, the index is stale if one of them changes
+        self.mtime: int = mtime
+        self.size: int = size
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+    @staticmethod
+    def build(path: str) -> 'JsonlIndex':
+        stat = os.stat(path)
+        offsets, lengths, doc_ids, parts, n_tokens = [], [], [], [], []
+        offset = 0
+        with open_file(path, 'rb') as fh:
+            for line in fh:
+                if line.strip():
+                    doc = loads(line)
+                    offsets.append(offset)
+                    lengths.append(len(line))
+                    doc_ids.append(doc['docID'])
+                    parts.append((doc.get('meta') or {}).get('part', ''))
+                    n_tokens.append(sum(len(sent['tokens']) for sent in doc.get('sentences', [])))
+                offset += len(line)
+        return JsonlIndex(np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64), doc_ids, parts,
+                          np.array(n_tokens, dtype=np.int64), mtime=stat.st_mtime_ns, size=stat.st_size)
+
+    @staticmethod
+    def load(path: str) -> 'JsonlIndex':
+        with open(path) as fh:
+            index = json.load(fh)
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {index.get('version')}.")
+        return JsonlIndex(np.array(index['offsets'], dtype=np.int64), np.array(index['lengths'], dtype=np.int64),
+                          index['doc_ids'], index['parts'], np.array(index['n_tokens'], dtype=np.int64),
+                          mtime=index['mtime'], size=index['size'])
+
+    def save(self, path: str):
+        with open(path, 'w') as fh:
+            json.dump({
+                'version': INDEX_VERSION,
+                'mtime': self.mtime,
+                'size': self.size,
+                'offsets': self.offsets.tolist(),
+                'lengths': self.lengths.tolist(),
+                'doc_ids': self.doc_ids,
+                'parts': self.parts,
+                'n_tokens': self.n_tokens.tolist(),
+            }, fh)
+
+    def is_valid(self, path: str) -> bool:
+        stat = os.stat(path)
+        return self.mtime == stat.st_mtime_ns and self.size == stat.st_size
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def select(self, tags: str = '') -> np.ndarray:
+        # positions of documents whose part is one of the comma separated tags
+        if not tags:
+            return np.arange(len(self))
+        tags = set(tags.split(','))
+        return np.array([i for i, part in enumerate(self.parts) if part in tags], dtype=np.int64)
+
+
+def get_index(path: str) -> JsonlIndex:
+    # sidecar index of the jsonl file, rebuilt if missing or outdated
+    index_path = get_index_path(path)
+    if os.path.exists(index_path):
+        try:
+            index = JsonlIndex.load(index_path)
+            if index.is_valid(path):
+                return index
+        except (ValueError, KeyError):
+            pass
+    index = JsonlIndex.build(path)
+    try:
+        index.save(index_path)
+    except OSError:
+        # read-only locations still get the in-memory index
+        pass
+    return index
+
+
+class JsonlCorpus:
+
+    def __init__(self, path: str, load_dependencies=True, load_relations=True, lazy=False):
+        self.path = path
+        self.index = get_index(path)
+        self.load_dependencies = load_dependencies
+        self.load_relations = load_relations
+        self.lazy = lazy
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.index.doc_index
+
+    def __iter__(self) -> Iterator[Document]:
+        return self.get_documents(np.arange(len(self)))
+
+    def __getitem__(self, key: Union[int, str, slice]) -> Union[Document, List[Document]]:
+        if isinstance(key, slice):
+            return list(self.get_documents(np.arange(len(self))[key]))
+        if isinstance(key, str):
+            key = self.index.doc_index[key]
+        return next(self.get_documents([key]))
+
+    def get_documents(self, positions: Sequence[int]) -> Iterator[Document]:
+        # documents are read in the given order, sorted positions keep the reads sequential
+        with BlockReader(self.path) as reader:
+            for i in np.asarray(positions, dtype=np.int64).tolist():
+                doc = loads(reader.read(int(self.index.offsets[i]), int(self.index.lengths[i])))
+                yield Document.from_json(doc, load_dependencies=self.load_dependencies,
+                                         load_relations=self.load_relations, lazy=self.lazy)
+
+    def select(self, tags: str = '') -> Iterator[Document]:
+        return self.get_documents(self.index.select(tags))
+
+    def sample(self, n: int, tags: str = '', seed=None) -> List[Document]:
+        positions = self.index.select(tags).tolist()
+        positions = sorted(random.Random(seed).sample(positions, min(n, len(positions))))
+        return list(self.get_documents(positions))
+
 
-def load_documents(fh: TextIO, tags: str = '') -> List[Document]:
+def load_documents(fh: Union[TextIO, str], tags: str = '') -> List[Document]:
+    # a path is loaded through the sidecar index, which is written next to the input as <path>.idx on first use,
+    # so only selected documents are parsed, open handles are read from their current position
+    if isinstance(fh, str):
+        try:
+            return list(JsonlCorpus(fh).select(tags))
+        except EOFError:
+            # truncated compressed input cannot be indexed, its complete documents are read as a stream
+            with open_file(fh) as stream:
+                return load_documents(stream, tags)
     if tags:
         tags = tags.split(',')
     docs = []
     try:
         for line in fh:
-            doc = Document.from_json(json.loads(line))
-            if not tags or doc.meta.get('part', '') in tags:
-                docs.append(doc)
+            # documents are filtered before they are built
+            doc = loads(line)
+            if not tags or doc.get('meta', {}).get('part', '') in tags:
+                docs.append(Document.from_json(doc))
     except EOFError:
         pass
     return docs
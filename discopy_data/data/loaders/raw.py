@@ -1,6 +1,4 @@
 import datetime
-import os
-import sys
 from typing import List
 
 from tqdm import tqdm
@@ -8,16 +6,11 @@ from tqdm import tqdm
 from discopy_data.data.doc import Document
 from discopy_data.data.sentence import Sentence, DepRel
 from discopy_data.data.token import Token
+from discopy_data.nn.registry import get_model
 
 
 def load_parser(use_gpu=False):
-    import trankit
-    tmp_stdout = sys.stdout
-    sys.stdout = sys.stderr
-    parser = trankit.Pipeline('english', cache_dir=os.path.expanduser('~/.trankit/'), gpu=use_gpu)
-    parser.tokenize("Init")
-    sys.stdout = tmp_stdout
-    return parser
+    return get_model('trankit', 'english', 'gpu' if use_gpu else 'cpu')
 
 
 def get_tokenized_sentences(parser, text):
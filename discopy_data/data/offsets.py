@@ -0,0 +1,62 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Span = Tuple[int, int]
+
+
+def expand_ranges(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # concatenation of all ranges lo[i]:hi[i] and the number i of the range each position belongs to
+    lengths = np.maximum(hi - lo, 0)
+    range_ids = np.repeat(np.arange(len(lo)), lengths)
+    range_starts = np.cumsum(lengths) - lengths
+    positions = np.arange(int(lengths.sum())) - range_starts[range_ids] + lo[range_ids]
+    return positions, range_ids
+
+
+class OffsetIndex:
+
+    def __init__(self, offset_begin: np.ndarray, offset_end: np.ndarray):
+        offset_begin = np.asarray(offset_begin, dtype=np.int64)
+        offset_end = np.asarray(offset_end, dtype=np.int64)
+        self.begin_order: np.ndarray = np.argsort(offset_begin, kind='stable')
+        self.begin: np.ndarray = offset_begin[self.begin_order]
+        self.end_order: np.ndarray = np.argsort(offset_end, kind='stable')
+        self.end: np.ndarray = offset_end[self.end_order]
+
+    def __len__(self):
+        return len(self.begin)
+
+    @staticmethod
+    def flatten(span_lists: Sequence[Sequence[Span]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        groups = np.repeat(np.arange(len(span_lists)), [len(spans) for spans in span_lists])
+        spans = np.array([span for spans in span_lists for span in spans], dtype=np.int64).reshape(-1, 2)
+        return spans[:, 0], spans[:, 1], groups
+
+    @staticmethod
+    def group(token_ids: np.ndarray, groups: np.ndarray, n_groups: int) -> List[np.ndarray]:
+        if n_groups == 0:
+            return []
+        order = np.lexsort((token_ids, groups))
+        token_ids, groups = token_ids[order], groups[order]
+        keep = np.ones(len(token_ids), dtype=bool)
+        keep[1:] = (token_ids[1:] != token_ids[:-1]) | (groups[1:] != groups[:-1])
+        token_ids, groups = token_ids[keep], groups[keep]
+        return np.split(token_ids, np.searchsorted(groups, np.arange(1, n_groups)))
+
+    def get_overlapping(self, span_lists: Sequence[Sequence[Span]]) -> List[np.ndarray]:
+        # tokens that begin within [start, end) or end within (start, end] of any span of each list
+        starts, ends, groups = self.flatten(span_lists)
+        begin_pos, begin_ids = expand_ranges(np.searchsorted(self.begin, starts, 'left'),
+                                             np.searchsorted(self.begin, ends, 'left'))
+        end_pos, end_ids = expand_ranges(np.searchsorted(self.end, starts, 'right'),
+                                         np.searchsorted(self.end, ends, 'right'))
+        token_ids = np.concatenate([self.begin_order[begin_pos], self.end_order[end_pos]])
+        return self.group(token_ids, groups[np.concatenate([begin_ids, end_ids])], len(span_lists))
+
+    def get_starting(self, span_lists: Sequence[Sequence[Span]]) -> List[np.ndarray]:
+        # tokens that begin within [start, end] of any span of each list
+        starts, ends, groups = self.flatten(span_lists)
+        pos, range_ids = expand_ranges(np.searchsorted(self.begin, starts, 'left'),
+                                       np.searchsorted(self.begin, ends, 'right'))
+        return self.group(self.begin_order[pos], groups[range_ids], len(span_lists))
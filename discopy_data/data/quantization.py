@@ -0,0 +1,116 @@
+import random
+import sys
+from typing import Dict, List, Union
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+
+class QuantizedEmbeddings:
+
+    def __init__(self, values: np.ndarray, scale: np.ndarray):
+        # int8 values of shape (tokens, dim), the embeddings are values * scale with one scale per dimension
+        self.values: np.ndarray = values
+        self.scale: np.ndarray = scale
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.scale.nbytes
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key) -> 'QuantizedEmbeddings':
+        # rows only, the result shares values and scale
+        return QuantizedEmbeddings(self.values[key], self.scale)
+
+    def dequantize(self) -> np.ndarray:
+        return self.values.astype(np.float32) * self.scale
+
+    def __array__(self, dtype=None, copy=None):
+        embeddings = self.dequantize()
+        return embeddings if dtype is None else embeddings.astype(dtype)
+
+
+Embeddings = Union[np.ndarray, QuantizedEmbeddings]
+
+
+def get_scale(embeddings: np.ndarray) -> np.ndarray:
+    scale = np.abs(embeddings).max(axis=0, initial=0).astype(np.float32) / 127
+    return np.where(scale > 0, scale, 1).astype(np.float32)
+
+
+def quantize(embeddings: np.ndarray, precision='float32', scale: np.ndarray = None) -> Embeddings:
+    if precision == 'float32':
+        return np.asarray(embeddings, dtype=np.float32)
+    if precision == 'float16':
+        return np.asarray(embeddings, dtype=np.float16)
+    if precision == 'int8':
+        scale = get_scale(embeddings) if scale is None else scale
+        values = np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8)
+        return QuantizedEmbeddings(values, scale)
+    raise ValueError(f'Unknown precision {precision}, expected one of {PRECISIONS}.')
+
+
+def dequantize(embeddings: Embeddings) -> np.ndarray:
+    # float32 embeddings for reduced precision input, other arrays are returned as they are
+    if isinstance(embeddings, QuantizedEmbeddings):
+        return embeddings.dequantize()
+    if embeddings.dtype == np.float16:
+        return embeddings.astype(np.float32)
+    return embeddings
+
+
+def concatenate(embeddings: List[Embeddings]) -> np.ndarray:
+    # batch dequantization, parts sharing one scale are dequantized together
+    if embeddings and all(isinstance(e, QuantizedEmbeddings) and e.scale is embeddings[0].scale for e in embeddings):
+        return np.concatenate([e.values for e in embeddings], axis=0).astype(np.float32) * embeddings[0].scale
+    return np.concatenate([dequantize(e) for e in embeddings], axis=0)
+
+
+def get_reconstruction_error(embeddings: np.ndarray, precision: str) -> Dict[str, float]:
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    quantized = quantize(embeddings, precision)
+    restored = dequantize(quantized)
+    diff = restored - embeddings
+    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(restored, axis=1)
+    cosine = (embeddings * restored).sum(axis=1) / np.maximum(norms, 1e-12)
+    return {
+        'bytes_per_token': quantized.nbytes / max(len(embeddings), 1),
+        'max_abs_error': float(np.abs(diff).max(initial=0)),
+        'relative_l2_error': float(np.linalg.norm(diff) / max(np.linalg.norm(embeddings), 1e-12)),
+        'min_cosine': float(cosine.min(initial=1)),
+        'mean_cosine': float(cosine.mean()) if len(cosine) else 1.0,
+    }
+
+
+def report_reconstruction_error(store_path: str, sample=100, seed=0):
+    # reconstruction error of float32 embeddings from a store for a sample of its documents, stores of reduced
+    # precision are already degraded and would hide the error
+    from discopy_data.data.embeddings import EmbeddingStore
+    store = EmbeddingStore(store_path)
+    if store.dtype != np.float32:
+        raise ValueError(f'Reconstruction error requires a float32 store, {store_path} is {store.dtype.name}.')
+    doc_ids = store.get_doc_ids()
+    doc_ids = random.Random(seed).sample(doc_ids, min(sample, len(doc_ids)))
+    embeddings = [np.asarray(store.get(doc_id)) for doc_id in doc_ids]
+    sys.stdout.write(f'{len(doc_ids)} documents, {sum(len(e) for e in embeddings)} tokens\n')
+    for precision in PRECISIONS:
+        errors = [get_reconstruction_error(e, precision) for e in embeddings]
+        sys.stdout.write('{:<8} {:>8.1f} bytes/token  max abs {:.5f}  rel l2 {:.5f}  cos min {:.5f} '
+                         'mean {:.5f}\n'.format(
+            precision,
+            np.mean([e['bytes_per_token'] for e in errors]),
+            max(e['max_abs_error'] for e in errors),
+            np.mean([e['relative_l2_error'] for e in errors]),
+            min(e['min_cosine'] for e in errors),
+            np.mean([e['mean_cosine'] for e in errors])))
+
+
+if __name__ == '__main__':
+    report_reconstruction_error(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 100)
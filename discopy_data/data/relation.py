@@ -1,5 +1,7 @@
 from typing import List
 
+import numpy as np
+
 from .token import TokenSpan
 
 
@@ -69,14 +71,25 @@ class Relation:
         return len(self.conn) > 0
 
     def distance(self, other):
-        d_args = jaccard_distance(self.arg1 | self.arg2, other.arg1 | other.arg2)
+        d_args = 1 - index_jaccard(np.union1d(self.arg1.indices, self.arg2.indices),
+                                   np.union1d(other.arg1.indices, other.arg2.indices))
         d_arg1 = jaccard_distance(self.arg1, other.arg1)
         d_conn = jaccard_distance(self.conn, other.conn)
         d_arg2 = jaccard_distance(self.arg2, other.arg2)
         return sum([d_args, d_arg1, d_arg2, d_conn]) / 4
 
 
+def index_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    # jaccard index of two sorted arrays of unique token indices
+    if len(a) == 0 and len(b) == 0:
+        return 1
+    intersection = len(np.intersect1d(a, b, assume_unique=True))
+    return intersection / (len(a) + len(b) - intersection)
+
+
 def jaccard_index(a, b):
+    if isinstance(a, TokenSpan) and isinstance(b, TokenSpan):
+        return index_jaccard(a.indices, b.indices)
     if len(a) == 0 and len(b) == 0:
         return 1
     else:
@@ -2,39 +2,100 @@ from collections import namedtuple
 from typing import List, Optional
 
 import nltk
-import numpy as np
 
+from .dependency import DependencyGraph
+from .quantization import dequantize
 from .token import Token
+from .tree import ConstituencyTree, get_tree_json
 
 DepRel = namedtuple('DepRel', ['rel', 'head', 'dep'])
 
 
 class Sentence:
-    def __init__(self, tokens, dependencies=None, parsetree=None, embeddings=None):
+    def __init__(self, tokens, dependencies=None, parsetree=None, embeddings=None, columns=None, sent_idx=-1,
+                 tree: ConstituencyTree = None):
         self.tokens: List[Token] = tokens
-        self.parsetree: str = parsetree or ""
-        self.dependencies: List[DepRel] = dependencies or []
-        self.__parsetree = None
-        self.embeddings: np.array = embeddings
+        # bracketed string and array encoding of the constituency tree, each created from the other if missing
+        self._parsetree: Optional[str] = parsetree or (None if tree is not None else "")
+        self._tree: Optional[ConstituencyTree] = tree
+        # sentences of column backed documents create their dependencies on first access
+        self.columns = columns
+        self.sent_idx: int = sent_idx
+        self._dependencies: Optional[List[DepRel]] = dependencies or ([] if columns is None else None)
+        self._ptree = None
+        self._dependency_graph: Optional[DependencyGraph] = None
+        self._embeddings = embeddings
+        # buffer of the document the embeddings are a view of
+        self._embedding_buffer = None
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    @embeddings.setter
+    def embeddings(self, embeddings):
+        # embeddings assigned to a single sentence detach it from the document buffer
+        self._embeddings = embeddings
+        if self._embedding_buffer is not None:
+            self._embedding_buffer.valid = False
+            self._embedding_buffer = None
+
+    @property
+    def parsetree(self) -> str:
+        if self._parsetree is None:
+            self._parsetree = self._tree.to_string()
+        return self._parsetree
+
+    @parsetree.setter
+    def parsetree(self, parsetree: str):
+        self._parsetree = parsetree or ""
+        self._tree = None
+        self._ptree = None
+
+    @property
+    def dependencies(self) -> List[DepRel]:
+        if self._dependencies is None:
+            self._dependencies = self.columns.get_dependencies(self.sent_idx, self.tokens)
+        return self._dependencies
+
+    @dependencies.setter
+    def dependencies(self, dependencies: List[DepRel]):
+        self._dependencies = dependencies
+        self._dependency_graph = None
+
+    def get_dependency_graph(self) -> DependencyGraph:
+        if self._dependency_graph is None:
+            if self._dependencies is None:
+                self._dependency_graph = DependencyGraph(*self.columns.get_dependency_heads(self.sent_idx))
+            else:
+                self._dependency_graph = DependencyGraph.from_dependencies(self._dependencies, len(self.tokens))
+        return self._dependency_graph
 
     def get_text(self) -> str:
         return ''.join([self.tokens[0].surface] +
                        [('' if self.tokens[t_i].offset_end == t.offset_begin else ' ') + t.surface
                         for t_i, t in enumerate(self.tokens[1:])])
 
+    def get_tree(self) -> Optional[ConstituencyTree]:
+        if self._tree is None and self.parsetree.strip():
+            try:
+                self._tree = ConstituencyTree.from_string(self.parsetree)
+            except ValueError:
+                return None
+        return self._tree
+
     def get_ptree(self) -> Optional[nltk.ParentedTree]:
-        if not self.__parsetree:
+        if not self._ptree:
             try:
-                ptree = nltk.Tree.fromstring(self.parsetree.strip())
-                ptree = nltk.ParentedTree.convert(ptree)
+                ptree = self.get_tree().to_nltk()
                 if not ptree.label().strip():
                     ptree = list(ptree)[0]
                 if not ptree.leaves():
                     return None
             except:
                 ptree = None
-            self.__parsetree = ptree
-        return self.__parsetree
+            self._ptree = ptree
+        return self._ptree
 
     def get_dtree(self) -> Optional[List[DepRel]]:
         # TODO set this to default
@@ -43,14 +104,19 @@ class Sentence:
     def get_embeddings(self):
         if self.embeddings is None:
             raise ValueError("Embeddings not found.")
-        return self.embeddings
+        # reduced precision embeddings are dequantized on access
+        return dequantize(self.embeddings)
 
-    def to_json(self) -> dict:
-        return {
-            'dependencies': [{
+    def to_json(self, tree_format='string') -> dict:
+        if self._dependencies is None:
+            dependencies = self.columns.dependencies_to_json(self.sent_idx)
+        else:
+            dependencies = [{
                 'head': (d.head.local_idx if d.head else -1),
                 'deprel': d.rel
-            } for d in self.dependencies],
-            'parsetree': self.parsetree,
+            } for d in self._dependencies]
+        return {
+            'dependencies': dependencies,
+            **get_tree_json(self._parsetree, self._tree, tree_format),
             'tokens': [t.to_json() for t in self.tokens]
         }
@@ -0,0 +1,102 @@
+import json
+import os
+import zlib
+from typing import Iterator, List
+
+from discopy_data.data.codec import JsonlWriter, read_jsonl
+from discopy_data.data.compression import open_file
+from discopy_data.data.doc import Document
+
+MANIFEST = 'manifest.json'
+STRATEGIES = ('hash', 'size')
+
+
+def get_shard_name(shard_i: int, n_shards: int, ext: str = '.json') -> str:
+    return f'shard-{shard_i:05}-of-{n_shards:05}{ext}'
+
+
+def get_doc_hash(doc_id: str) -> int:
+    # stable across processes and python versions, unlike hash()
+    return zlib.crc32(doc_id.encode('utf8'))
+
+
+class ShardedWriter:
+
+    def __init__(self, path: str, n_shards: int, strategy='hash', ext='.json', flush_interval=16):
+        # hash puts each document into the shard given by its docID, size adds it to the shard with fewest tokens
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown sharding strategy {strategy}, expected one of {STRATEGIES}.')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.strategy = strategy
+        self.names = [get_shard_name(shard_i, n_shards, ext) for shard_i in range(n_shards)]
+        self.files = [open_file(os.path.join(path, name), 'w') for name in self.names]
+        self.writers = [JsonlWriter(fh, flush_interval) for fh in self.files]
+        self.documents = [0] * n_shards
+        self.tokens = [0] * n_shards
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_shard(self, doc: dict) -> int:
+        if self.strategy == 'hash':
+            return get_doc_hash(doc['docID']) % len(self.writers)
+        return min(range(len(self.writers)), key=lambda shard_i: (self.tokens[shard_i], self.documents[shard_i]))
+
+    def write(self, doc: dict):
+        shard_i = self.get_shard(doc)
+        self.writers[shard_i].write(doc)
+        self.documents[shard_i] += 1
+        self.tokens[shard_i] += sum(len(sent['tokens']) for sent in doc.get('sentences', []))
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def close(self):
+        self.flush()
+        for fh in self.files:
+            fh.close()
+        with open(os.path.join(self.path, MANIFEST), 'w') as fh:
+            json.dump({
+                'strategy': self.strategy,
+                'documents': sum(self.documents),
+                'tokens': sum(self.tokens),
+                'shards': [{'path': name, 'documents': documents, 'tokens': tokens}
+                           for name, documents, tokens in zip(self.names, self.documents, self.tokens)],
+            }, fh, indent=2)
+
+
+class ShardedCorpus:
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as fh:
+            self.manifest = json.load(fh)
+        self.shards: List[dict] = self.manifest['shards']
+
+    def __len__(self):
+        return self.manifest['documents']
+
+    def get_shards(self, rank=0, world_size=1) -> List[dict]:
+        # every worker computes the same assignment, larger shards first go to the worker with fewest tokens
+        if not 0 <= rank < world_size:
+            raise ValueError(f'Rank {rank} is not within world size {world_size}.')
+        loads = [0] * world_size
+        assignment = [[] for _ in range(world_size)]
+        for shard_i in sorted(range(len(self.shards)), key=lambda i: (-self.shards[i]['tokens'], i)):
+            worker = min(range(world_size), key=lambda w: (loads[w], w))
+            loads[worker] += self.shards[shard_i]['tokens']
+            assignment[worker].append(shard_i)
+        return [self.shards[shard_i] for shard_i in sorted(assignment[rank])]
+
+    def iter_documents(self, rank=0, world_size=1, load_dependencies=True, load_relations=True,
+                       lazy=False) -> Iterator[Document]:
+        for shard in self.get_shards(rank, world_size):
+            with open_file(os.path.join(self.path, shard['path'])) as fh:
+                for doc in read_jsonl(fh):
+                    yield Document.from_json(doc, load_dependencies=load_dependencies,
+                                             load_relations=load_relations, lazy=lazy)
@@ -0,0 +1,36 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+class StringTable:
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = []
+        self.ids: Dict[str, int] = {}
+        for s in strings:
+            self.add(s)
+
+    def add(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.ids[s] = i
+            self.strings.append(s)
+        return i
+
+    def encode(self, strings: Iterable[str]) -> np.ndarray:
+        return np.array([self.add(s) for s in strings], dtype=np.int32)
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        return [self.strings[i] for i in ids]
+
+    def __getitem__(self, i: int) -> str:
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# process wide table for tags, lemmas, and dependency and constituent labels, id 0 is always the empty string
+STRINGS = StringTable([''])
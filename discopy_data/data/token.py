@@ -1,11 +1,14 @@
 import re
 import string
-from typing import List
+from typing import List, Optional
+
+import numpy as np
 
 RE_PUNCT = re.compile(r'^[\s{}]+$'.format(re.escape(string.punctuation)))
 
 
 class Token:
+    __slots__ = ('surface', 'upos', 'xpos', 'lemma', 'idx', 'sent_idx', 'local_idx', 'offset_begin', 'offset_end')
 
     def __init__(self, idx, sent_idx, local_idx, offset_begin, offset_end, surface, upos="", xpos="", lemma=""):
         self.surface: str = surface
@@ -25,7 +28,7 @@ class Token:
         return f"{self.idx}-{self.surface}:{self.upos}"
 
     def __hash__(self):
-        return hash(str(self))
+        return hash((self.idx, self.offset_begin, self.offset_end))
 
     __repr__ = __str__
 
@@ -54,6 +57,23 @@ class TokenSpan:
 
     def __init__(self, tokens):
         self.tokens: List[Token] = list(tokens)
+        self._indices: Optional[np.ndarray] = None
+        self._positions: Optional[np.ndarray] = None
+
+    @property
+    def indices(self) -> np.ndarray:
+        # sorted and unique global token indices, set operations assume spans of the same document
+        if self._indices is None:
+            indices = np.fromiter((t.idx for t in self.tokens), np.int32, len(self.tokens))
+            self._indices, self._positions = np.unique(indices, return_index=True)
+        return self._indices
+
+    @property
+    def positions(self) -> np.ndarray:
+        # position in self.tokens of the first token of each entry of self.indices
+        if self._positions is None:
+            _ = self.indices
+        return self._positions
 
     def get_sentence_idxs(self):
         return sorted(set(t.sent_idx for t in self.tokens))
@@ -75,22 +95,43 @@ class TokenSpan:
         return spans
 
     def overlap(self, other: 'TokenSpan') -> int:
-        return sum(int(i == j) for i in self.tokens for j in other.tokens)
+        return len(np.intersect1d(self.indices, other.indices, assume_unique=True))
 
     def without_punct(self):
         return TokenSpan(t for t in self.tokens if not RE_PUNCT.match(t.surface))
 
     def add(self, token: Token):
         self.tokens.append(token)
+        self._indices = None
+        self._positions = None
+
+    def select(self, mask: np.ndarray) -> 'TokenSpan':
+        positions = self.positions[mask]
+        span = TokenSpan([self.tokens[p] for p in positions.tolist()])
+        span._indices = self.indices[mask]
+        span._positions = np.arange(len(positions))
+        return span
 
     def __or__(self, other):
-        tokens = sorted(set(self.tokens) | set(other.tokens), key=lambda t: t.idx)
+        indices, first = np.unique(np.concatenate([self.indices, other.indices]), return_index=True)
+        positions = np.concatenate([self.positions, other.positions + len(self.tokens)])[first]
+        tokens = self.tokens + other.tokens
+        span = TokenSpan([tokens[p] for p in positions.tolist()])
         # TODO consistency check!
-        return TokenSpan(tokens)
+        span._indices = indices
+        span._positions = np.arange(len(indices))
+        return span
 
     def __and__(self, other):
-        tokens = sorted(set(self.tokens) & set(other.tokens), key=lambda t: t.idx)
-        return TokenSpan(tokens)
+        return self.select(np.isin(self.indices, other.indices, assume_unique=True))
+
+    def __sub__(self, other):
+        return self.select(np.isin(self.indices, other.indices, assume_unique=True, invert=True))
+
+    def __eq__(self, other):
+        return isinstance(other, TokenSpan) and np.array_equal(self.indices, other.indices)
+
+    __hash__ = None
 
     def __len__(self):
         return len(self.tokens)
@@ -0,0 +1,201 @@
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .strings import STRINGS
+
+TREE_TOKENS = re.compile(r'\(\s*([^\s()]*)|\)|([^\s()]+)')
+
+
+class ConstituencyTree:
+
+    def __init__(self, parents: np.ndarray, labels: np.ndarray, leaf_begin: np.ndarray, leaf_end: np.ndarray,
+                 leaves: List[str]):
+        # nodes are stored in pre-order, the root has parent -1
+        self.parents: np.ndarray = parents
+        # ids into STRINGS
+        self.labels: np.ndarray = labels
+        # each node covers the leaves leaf_begin:leaf_end
+        self.leaf_begin: np.ndarray = leaf_begin
+        self.leaf_end: np.ndarray = leaf_end
+        self.leaves: List[str] = leaves
+        self._depth: Optional[np.ndarray] = None
+        self._leaf_nodes: Optional[np.ndarray] = None
+        self._child_ptr: Optional[np.ndarray] = None
+        self._child_idx: Optional[np.ndarray] = None
+
+    @staticmethod
+    def from_string(parsetree: str) -> 'ConstituencyTree':
+        parents, labels, leaf_begin, leaf_end, leaves = [], [], [], [], []
+        stack = []
+        for match in TREE_TOKENS.finditer(parsetree):
+            if match.group(1) is not None:
+                if not stack and labels:
+                    raise ValueError('Tree string contains more than one tree.')
+                stack.append(len(labels))
+                parents.append(stack[-2] if len(stack) > 1 else -1)
+                labels.append(match.group(1))
+                leaf_begin.append(len(leaves))
+                leaf_end.append(-1)
+            elif match.group(2) is not None:
+                if not stack:
+                    raise ValueError('Tree string contains a leaf outside of a tree.')
+                leaves.append(match.group(2))
+            else:
+                if not stack:
+                    raise ValueError('Tree string contains an unbalanced closing bracket.')
+                leaf_end[stack.pop()] = len(leaves)
+        if stack or not labels:
+            raise ValueError('Tree string is incomplete.')
+        return ConstituencyTree(np.array(parents, dtype=np.int32), STRINGS.encode(labels),
+                                np.array(leaf_begin, dtype=np.int32), np.array(leaf_end, dtype=np.int32), leaves)
+
+    @staticmethod
+    def from_json(tree: dict) -> 'ConstituencyTree':
+        return ConstituencyTree(np.array(tree['parents'], dtype=np.int32), STRINGS.encode(tree['labels']),
+                                np.array(tree['leaf_begin'], dtype=np.int32),
+                                np.array(tree['leaf_end'], dtype=np.int32), list(tree['leaves']))
+
+    def to_json(self) -> dict:
+        return {
+            'parents': self.parents.tolist(),
+            'labels': STRINGS.decode(self.labels.tolist()),
+            'leaf_begin': self.leaf_begin.tolist(),
+            'leaf_end': self.leaf_end.tolist(),
+            'leaves': self.leaves,
+        }
+
+    def __len__(self):
+        return len(self.parents)
+
+    def get_label(self, node: int) -> str:
+        return STRINGS[self.labels[node]]
+
+    def get_children(self) -> List[List[int]]:
+        children = [[] for _ in range(len(self))]
+        for node, parent in enumerate(self.parents.tolist()):
+            if parent >= 0:
+                children[parent].append(node)
+        return children
+
+    def get_items(self, children: List[List[int]], node: int) -> list:
+        # child nodes and directly attached leaves of node in order, leaves are strings
+        items = []
+        pos = int(self.leaf_begin[node])
+        for child in children[node]:
+            items.extend(self.leaves[pos:self.leaf_begin[child]])
+            items.append(child)
+            pos = int(self.leaf_end[child])
+        items.extend(self.leaves[pos:self.leaf_end[node]])
+        return items
+
+    @property
+    def depth(self) -> np.ndarray:
+        if self._depth is None:
+            depth = [0] * len(self)
+            # parents precede their children in pre-order
+            for node, parent in enumerate(self.parents.tolist()):
+                if parent >= 0:
+                    depth[node] = depth[parent] + 1
+            self._depth = np.array(depth, dtype=np.int32)
+        return self._depth
+
+    @property
+    def leaf_nodes(self) -> np.ndarray:
+        # lowest node above each leaf, usually its pre-terminal
+        if self._leaf_nodes is None:
+            leaf_nodes = np.full(len(self.leaves), -1, dtype=np.int32)
+            for node, (begin, end) in enumerate(zip(self.leaf_begin.tolist(), self.leaf_end.tolist())):
+                leaf_nodes[begin:end] = node
+            self._leaf_nodes = leaf_nodes
+        return self._leaf_nodes
+
+    def get_child_nodes(self, node: int) -> np.ndarray:
+        if self._child_ptr is None:
+            parents = np.where(self.parents >= 0, self.parents, len(self))
+            self._child_ptr = np.zeros(len(self) + 2, dtype=np.int32)
+            np.cumsum(np.bincount(parents, minlength=len(self) + 1), out=self._child_ptr[1:])
+            self._child_idx = np.argsort(parents, kind='stable').astype(np.int32)
+        return self._child_idx[self._child_ptr[node]:self._child_ptr[node + 1]]
+
+    def get_covering_nodes(self, begins, ends) -> np.ndarray:
+        # lowest node covering each leaf span begin:end, -1 if the span exceeds the tree
+        begins, ends = np.asarray(begins, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        covers = (self.leaf_begin[None, :] <= begins[:, None]) & (self.leaf_end[None, :] >= ends[:, None])
+        # covering nodes form a chain from the root, so the lowest one comes last in pre-order
+        lowest = len(self) - 1 - np.argmax(covers[:, ::-1], axis=1)
+        return np.where(covers.any(axis=1), lowest, -1)
+
+    def get_exact_nodes(self, begins, ends) -> np.ndarray:
+        # highest node covering exactly the leaf span begin:end, -1 if there is none
+        begins, ends = np.asarray(begins, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        exact = (self.leaf_begin[None, :] == begins[:, None]) & (self.leaf_end[None, :] == ends[:, None])
+        return np.where(exact.any(axis=1), np.argmax(exact, axis=1), -1)
+
+    def get_siblings(self, nodes) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # left and right siblings of each node
+        siblings = []
+        for node, parent in zip(np.asarray(nodes).tolist(), self.parents[np.asarray(nodes)].tolist()):
+            if node < 0 or parent < 0:
+                siblings.append((np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)))
+                continue
+            children = self.get_child_nodes(parent)
+            position = int(np.searchsorted(children, node))
+            siblings.append((children[:position], children[position + 1:]))
+        return siblings
+
+    def get_paths(self, a, b) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # nodes from the leaf a up to the lowest common ancestor, and the nodes below it down to the leaf b
+        a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+        lca = self.get_covering_nodes(np.minimum(a, b), np.maximum(a, b) + 1)
+        a_nodes, b_nodes = self.leaf_nodes[a], self.leaf_nodes[b]
+        steps = [np.stack([a_nodes, b_nodes])]
+        for _ in range(int(self.depth.max(initial=0))):
+            steps.append(np.where(steps[-1] >= 0, self.parents[steps[-1]], -1))
+        steps = np.stack(steps, axis=-1)
+        up_lengths = (self.depth[a_nodes] - self.depth[lca] + 1).tolist()
+        down_lengths = (self.depth[b_nodes] - self.depth[lca]).tolist()
+        return [(steps[0, i, :up], steps[1, i, :down][::-1])
+                for i, (up, down) in enumerate(zip(up_lengths, down_lengths))]
+
+    def get_path_labels(self, a, b) -> List[str]:
+        return ['↑'.join(self.get_label(n) for n in up.tolist()) +
+                ''.join('↓' + self.get_label(n) for n in down.tolist())
+                for up, down in self.get_paths(a, b)]
+
+    def to_string(self) -> str:
+        children = self.get_children()
+
+        def helper(node):
+            items = [helper(i) if isinstance(i, int) else i for i in self.get_items(children, node)]
+            return '({})'.format(' '.join([self.get_label(node)] + items))
+
+        return helper(0)
+
+    def to_nltk(self):
+        import nltk
+        children = self.get_children()
+
+        def helper(node):
+            return nltk.Tree(self.get_label(node),
+                             [helper(i) if isinstance(i, int) else i for i in self.get_items(children, node)])
+
+        return nltk.ParentedTree.convert(helper(0))
+
+
+def get_tree_json(parsetree: Optional[str], tree: Optional[ConstituencyTree], tree_format='string') -> dict:
+    # parsetree string and/or array encoded tree for the sentence json, tree_format is string, array, or both
+    result = {}
+    if tree_format in ('string', 'both'):
+        if parsetree is None:
+            parsetree = tree.to_string() if tree is not None else ""
+        result['parsetree'] = parsetree
+    if tree_format in ('array', 'both'):
+        if tree is None and parsetree and parsetree.strip():
+            try:
+                tree = ConstituencyTree.from_string(parsetree)
+            except ValueError:
+                tree = None
+        result['ptree'] = tree.to_json() if tree is not None else None
+    return result
@@ -1,9 +1,11 @@
-import os
 import sys
 from typing import List
 
-from discopy_data.nn.bert import get_sentence_embeddings
+from discopy_data.data.embeddings import SentenceCache
+from discopy_data.nn.bert import LayerPooling, get_corpus_embeddings
+from discopy_data.nn.registry import get_model
 from .doc import Document
+from .quantization import quantize
 from .sentence import DepRel
 
 
@@ -41,10 +43,8 @@ def get_dependency_parse(dependency_parser, inputs, words):
 
 def update_dataset_parses(docs: List[Document], constituent_parser='crf-con-en',
                           dependency_parser='biaffine-dep-en'):
-    os.environ['CUDA_VISIBLE_DEVICES'] = ''
-    import supar
-    cparser = supar.Parser.load(constituent_parser) if constituent_parser else None
-    dparser = supar.Parser.load(dependency_parser) if dependency_parser else None
+    cparser = get_model('supar', constituent_parser, 'cpu') if constituent_parser else None
+    dparser = get_model('supar', dependency_parser, 'cpu') if dependency_parser else None
     for doc in docs:
         for sent_i, sent in enumerate(doc.sentences):
             inputs = [(t.surface, t.upos) for t in sent.tokens]
@@ -54,12 +54,16 @@ def update_dataset_parses(docs: List[Document], constituent_parser='crf-con-en',
             doc.sentences[sent_i].parsetree = parsetree if constituent_parser else sent.parsetree
 
 
-def update_dataset_embeddings(docs: List[Document], bert_model='bert-base-cased'):
-    from transformers import AutoTokenizer, TFAutoModel
-    tokenizer = AutoTokenizer.from_pretrained(bert_model)
-    model = TFAutoModel.from_pretrained(bert_model)
-    for doc in docs:
-        for sent_i, sent in enumerate(doc.sentences):
-            sent_words = sent.tokens
-            embeddings = get_sentence_embeddings(sent_words, tokenizer, model)
-            doc.sentences[sent_i].embeddings = embeddings
+def update_dataset_embeddings(docs: List[Document], bert_model='bert-base-cased', precision='float32',
+                              max_tokens=8192, window=None, stride=None, layer_pooling: LayerPooling = None,
+                              pooling='first', sentence_cache='', sentence_cache_size=8 * 2 ** 30, device=''):
+    tokenizer = get_model('tokenizer', bert_model)
+    model = get_model('transformer', bert_model, device)
+    cache = SentenceCache(sentence_cache, sentence_cache_size) if sentence_cache else None
+    # sentences of all documents are batched by length, sentences found in the cache are not encoded again
+    doc_embeddings = get_corpus_embeddings([doc.sentences for doc in docs], tokenizer, model, max_tokens=max_tokens,
+                                           pooling=pooling, window=window, stride=stride,
+                                           layer_pooling=layer_pooling, cache=cache,
+                                           cache_config={'model': bert_model})
+    for doc, embeddings in zip(docs, doc_embeddings):
+        doc.embeddings = quantize(embeddings, precision)
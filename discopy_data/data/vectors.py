@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+MATRIX = 'vectors.bin'
+WORDS = 'words.bin'
+OFFSETS = 'offsets.npy'
+TABLE = 'table.npy'
+META = 'meta.json'
+
+
+def get_word_hash(word: bytes) -> int:
+    # stable across processes and python versions, unlike hash()
+    return zlib.crc32(word)
+
+
+def get_table_size(n_words: int) -> int:
+    # open addressing with linear probing, the table is at most half full
+    size = 1
+    while size < 2 * n_words:
+        size *= 2
+    return size
+
+
+def convert_vectors(vector_path: str, path: str, encoding='utf8'):
+    # one-time conversion of a GloVe or fastText text file into a float32 matrix, the words next to each other in
+    # one blob, and a hash table from word to row
+    os.makedirs(path, exist_ok=True)
+    words, offsets = [], [0]
+    dim = None
+    total, total_sq, n_values = 0.0, 0.0, 0
+    with open(vector_path, encoding=encoding) as fh, open(os.path.join(path, MATRIX), 'wb') as matrix_fh, \
+            open(os.path.join(path, WORDS), 'wb') as words_fh:
+        for line_i, line in enumerate(fh):
+            parts = line.rstrip().split(' ')
+            # fastText files start with the number of words and dimensions
+            if line_i == 0 and len(parts) == 2:
+                continue
+            if dim is None:
+                dim = len(parts) - 1
+            # words may contain spaces, the values are the last dim fields
+            word, values = ' '.join(parts[:-dim]), parts[-dim:]
+            if not word or len(parts) <= dim:
+                continue
+            vector = np.asarray(values, dtype=np.float32)
+            matrix_fh.write(vector.tobytes())
+            word = word.encode('utf8')
+            words_fh.write(word)
+            words.append(word)
+            offsets.append(offsets[-1] + len(word))
+            total += float(vector.sum(dtype=np.float64))
+            total_sq += float(np.square(vector, dtype=np.float64).sum())
+            n_values += dim
+    table = np.full(get_table_size(len(words)), -1, dtype=np.int64)
+    mask = len(table) - 1
+    for row, word in enumerate(words):
+        slot = get_word_hash(word) & mask
+        # a repeated word points to its last vector
+        while table[slot] >= 0 and words[table[slot]] != word:
+            slot = (slot + 1) & mask
+        table[slot] = row
+    np.save(os.path.join(path, OFFSETS), np.asarray(offsets, dtype=np.int64))
+    np.save(os.path.join(path, TABLE), table)
+    mean = total / max(n_values, 1)
+    with open(os.path.join(path, META), 'w') as fh:
+        json.dump({
+            'words': len(words),
+            'dim': dim or 0,
+            'mean': mean,
+            'std': max(total_sq / max(n_values, 1) - mean ** 2, 0.0) ** 0.5,
+            'source': os.path.abspath(vector_path),
+        }, fh)
+
+
+class VectorStore:
+
+    def __init__(self, path: str):
+        # all files are mapped read-only, worker processes share the pages of the matrix
+        with open(os.path.join(path, META)) as fh:
+            self.meta: dict = json.load(fh)
+        self.dim: int = self.meta['dim']
+        self.mean: float = self.meta['mean']
+        self.std: float = self.meta['std']
+        self.table: np.ndarray = np.load(os.path.join(path, TABLE), mmap_mode='r')
+        self.offsets: np.ndarray = np.load(os.path.join(path, OFFSETS), mmap_mode='r')
+        self.mask = len(self.table) - 1
+        if self.meta['words']:
+            self.words = np.memmap(os.path.join(path, WORDS), dtype=np.uint8, mode='r')
+            self.matrix = np.memmap(os.path.join(path, MATRIX), dtype=np.float32, mode='r',
+                                    shape=(self.meta['words'], self.dim))
+        else:
+            self.words = np.zeros(0, dtype=np.uint8)
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def get_word(self, row: int) -> str:
+        return self.words[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf8')
+
+    def get_id(self, word: str) -> int:
+        # row of the word or -1
+        word = word.encode('utf8')
+        slot = get_word_hash(word) & self.mask
+        while True:
+            row = int(self.table[slot])
+            if row < 0:
+                return -1
+            if self.words[self.offsets[row]:self.offsets[row + 1]].tobytes() == word:
+                return row
+            slot = (slot + 1) & self.mask
+
+    def get(self, word: str) -> Optional[np.ndarray]:
+        row = self.get_id(word)
+        return self.matrix[row] if row >= 0 else None
+
+    def __contains__(self, word: str):
+        return self.get_id(word) >= 0
+
+    def __getitem__(self, word: str) -> np.ndarray:
+        row = self.get_id(word)
+        if row < 0:
+            raise KeyError(word)
+        return self.matrix[row]
+
+    def get_ids(self, words: List[str]) -> np.ndarray:
+        return np.array([self.get_id(word) for word in words], dtype=np.int64)
+
+
+VectorIndex = Union[VectorStore, Dict[str, np.ndarray]]
+
+
+def get_oov_vector(word: str, dim: int, mean: float, std: float) -> np.ndarray:
+    # seeded by the word, the same word gets the same vector in every sentence, run, and process
+    return np.random.default_rng(get_word_hash(word.encode('utf8'))).normal(mean, std, dim).astype(np.float32)
+
+
+def get_vocab_vectors(vocab: List[str], embedding_index: VectorIndex, mean: float, std: float) -> np.ndarray:
+    # one row per word, known words are gathered at once from a vector store
+    if isinstance(embedding_index, VectorStore):
+        dim = embedding_index.dim
+        ids = embedding_index.get_ids(vocab)
+        vectors = np.zeros((len(vocab), dim), dtype=np.float32)
+        vectors[ids >= 0] = embedding_index.matrix[ids[ids >= 0]]
+        known = (ids >= 0).tolist()
+    else:
+        dim = len(next(iter(embedding_index.values())))
+        vectors = np.zeros((len(vocab), dim), dtype=np.float32)
+        known = [word in embedding_index for word in vocab]
+        for i, word in enumerate(vocab):
+            if known[i]:
+                vectors[i] = embedding_index[word]
+    for i, word in enumerate(vocab):
+        if not known[i]:
+            vectors[i] = get_oov_vector(word, dim, mean, std)
+    return vectors
+
+
+def get_vector_embeddings(words: List[str], embedding_index: VectorIndex, mean: float, std: float) -> np.ndarray:
+    # words are mapped to vocabulary ids once and the embeddings are gathered with one index operation
+    vocab: Dict[str, int] = {}
+    ids = np.array([vocab.setdefault(word, len(vocab)) for word in words], dtype=np.int64)
+    return get_vocab_vectors(list(vocab), embedding_index, mean, std)[ids]
+
+
+def load_vectors(vector_path: str) -> VectorStore:
+    # text files are converted next to the original on first use, into a temporary directory that is renamed
+    # once complete, so processes starting together never read or write a half converted store
+    if os.path.isdir(vector_path):
+        return VectorStore(vector_path)
+    path = vector_path + '.vectors'
+    if not os.path.exists(os.path.join(path, META)):
+        tmp_path = tempfile.mkdtemp(prefix=os.path.basename(path) + '.', dir=os.path.dirname(path) or '.')
+        try:
+            convert_vectors(vector_path, tmp_path)
+            # a directory without meta data is left over from an interrupted conversion
+            if os.path.isdir(path) and not os.path.exists(os.path.join(path, META)):
+                shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                # another process finished its conversion first
+                if not os.path.exists(os.path.join(path, META)):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return VectorStore(path)
+
+
+if __name__ == '__main__':
+    convert_vectors(sys.argv[1], sys.argv[2])
+    sys.stdout.write('Converted {words} word vectors of dimension {dim}.\n'.format(**VectorStore(sys.argv[2]).meta))
@@ -62,14 +62,11 @@ def update_annotations(source_path: str, options: dict):
         content = zh_brat.open(doc.meta['path'][:-3] + 'ann').read().decode().splitlines(keepends=True)
         annos = [tuple(a.strip().split("\t")) for a in content]
         arguments = extract_arguments(annos, doc.text)
-        words = doc.get_tokens()
+        rel_tokens = doc.get_starting_tokens([[(arg[part]['offset'], arg[part]['offset'] + arg[part]['length'])]
+                                              for arg in arguments for part in ('Arg1', 'Arg2')])
         relations = [
-            Relation([t for t in words if
-                      arg['Arg1']['offset'] <= t.offset_begin <= (arg['Arg1']['offset'] + arg['Arg1']['length'])],
-                     [t for t in words if
-                      arg['Arg2']['offset'] <= t.offset_begin <= (arg['Arg2']['offset'] + arg['Arg2']['length'])],
-                     [],
-                     arg['Sense'], 'Argumentation') for arg in arguments
+            Relation(rel_tokens[2 * arg_i], rel_tokens[2 * arg_i + 1], [], arg['Sense'], 'Argumentation')
+            for arg_i, arg in enumerate(arguments)
         ]
         return doc.with_relations(relations)
 
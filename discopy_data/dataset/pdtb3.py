@@ -38,23 +38,16 @@ def update_annotations(src: str, options: dict):
     def helper(doc: Document):
         relations = [{column: value for column, value in zip(fields, line.strip().split('|'))}
                      for line in open(relation_files[doc.meta['wsj']], 'r', encoding='latin-1')]
-        words = doc.get_tokens()
+        span_lists = [get_spans(rel[field]) for rel in relations
+                      for field in ('Arg1SpanList', 'Arg2SpanList', 'ConnSpanList')]
+        rel_tokens = doc.get_overlapping_tokens(span_lists)
         doc_relations = []
-        for rel in relations:
-            arg1_spans = get_spans(rel['Arg1SpanList'])
-            arg2_spans = get_spans(rel['Arg2SpanList'])
-            conn_spans = get_spans(rel['ConnSpanList'])
+        for rel_i, rel in enumerate(relations):
             senses = [rel['SClass1A']]
             if rel['SClass1B']:
                 senses.append(rel['SClass1B'])
-            doc_relations.append(
-                Relation([t for t in words if any(start <= t.offset_begin < end or start < t.offset_end <= end
-                                                  for start, end in arg1_spans)],
-                         [t for t in words if any(start <= t.offset_begin < end or start < t.offset_end <= end
-                                                  for start, end in arg2_spans)],
-                         [t for t in words if any(start <= t.offset_begin < end or start < t.offset_end <= end
-                                                  for start, end in conn_spans)],
-                         senses, rel['Relation']))
+            arg1, arg2, conn = rel_tokens[3 * rel_i:3 * rel_i + 3]
+            doc_relations.append(Relation(arg1, arg2, conn, senses, rel['Relation']))
         return doc.with_relations(doc_relations)
 
     return helper
@@ -0,0 +1,145 @@
+from multiprocessing import Pool
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from discopy_data.data.alignment import get_incidence
+from discopy_data.data.doc import Document
+
+SUBSETS = ('all', 'explicit', 'non-explicit')
+METRICS = ('arg1', 'arg2', 'args', 'conn', 'relation', 'sense')
+
+
+class DocumentRelations:
+
+    def __init__(self, parts: List[List[np.ndarray]], types: List[str], senses: List[List[str]]):
+        # token indices of arg1, arg2, and conn of each relation
+        self.parts: List[List[np.ndarray]] = parts
+        self.types: List[str] = types
+        self.senses: List[List[str]] = senses
+
+    @staticmethod
+    def from_document(doc: Document) -> 'DocumentRelations':
+        return DocumentRelations(*doc.get_relation_indices())
+
+    @staticmethod
+    def empty() -> 'DocumentRelations':
+        return DocumentRelations([[], [], []], [], [])
+
+    def __len__(self):
+        return len(self.types)
+
+    def get_n_tokens(self) -> int:
+        return max((int(p[-1]) + 1 for part in self.parts for p in part if len(p)), default=0)
+
+    def get_subset(self, subset: str) -> 'DocumentRelations':
+        if subset == 'all':
+            return self
+        keep = [(t == 'Explicit') == (subset == 'explicit') for t in self.types]
+        return DocumentRelations([[p for p, k in zip(part, keep) if k] for part in self.parts],
+                                 [t for t, k in zip(self.types, keep) if k],
+                                 [s for s, k in zip(self.senses, keep) if k])
+
+
+def get_span_matches(gold: List[np.ndarray], pred: List[np.ndarray], n_tokens: int, partial=False,
+                     cutoff=0.7) -> np.ndarray:
+    x, y = get_incidence(gold, n_tokens), get_incidence(pred, n_tokens)
+    intersection = x @ y.T
+    sizes = x.sum(axis=1)[:, None] + y.sum(axis=1)[None, :]
+    if partial:
+        # token level f1 of at least cutoff, two empty spans match
+        return np.where(sizes > 0, 2 * intersection / np.maximum(sizes, 1), 1) >= cutoff
+    return 2 * intersection == sizes
+
+
+def get_sense_matches(gold: DocumentRelations, pred: DocumentRelations) -> np.ndarray:
+    # the first predicted sense is one of the gold senses
+    sense_ids = {}
+    pred_ids = np.array([sense_ids.setdefault(s[0], len(sense_ids)) if s else -1 for s in pred.senses], dtype=int)
+    gold_senses = np.zeros((len(gold), len(sense_ids) + 1), dtype=bool)
+    for g_i, senses in enumerate(gold.senses):
+        gold_senses[g_i, [sense_ids[s] for s in senses if s in sense_ids]] = True
+    return gold_senses[:, pred_ids]
+
+
+def count_matches(matches: np.ndarray) -> int:
+    # greedy one-to-one matching of gold (rows) and predicted (columns) relations
+    used = set()
+    matched_row = -1
+    rows, cols = np.nonzero(matches)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if row != matched_row and col not in used:
+            used.add(col)
+            matched_row = row
+    return len(used)
+
+
+def score_document(gold: DocumentRelations, pred: DocumentRelations, partial=False, cutoff=0.7) -> np.ndarray:
+    # number of correct, predicted, and gold relations for each subset and metric
+    counts = np.zeros((len(SUBSETS), len(METRICS), 3), dtype=np.int64)
+    for s_i, subset in enumerate(SUBSETS):
+        g, p = gold.get_subset(subset), pred.get_subset(subset)
+        n_tokens = max(g.get_n_tokens(), p.get_n_tokens())
+        arg1, arg2, conn = (get_span_matches(g_part, p_part, n_tokens, partial, cutoff)
+                            for g_part, p_part in zip(g.parts, p.parts))
+        relation = arg1 & arg2 & conn
+        matches = {
+            'arg1': arg1,
+            'arg2': arg2,
+            'args': arg1 & arg2,
+            'relation': relation,
+            'sense': relation & get_sense_matches(g, p),
+        }
+        for metric, metric_matches in matches.items():
+            counts[s_i, METRICS.index(metric)] = count_matches(metric_matches), len(p), len(g)
+        # connectives are only scored for relations that have one
+        gold_conn = np.array([len(c) > 0 for c in g.parts[2]], dtype=bool)
+        pred_conn = np.array([len(c) > 0 for c in p.parts[2]], dtype=bool)
+        conn = conn[gold_conn][:, pred_conn]
+        counts[s_i, METRICS.index('conn')] = count_matches(conn), pred_conn.sum(), gold_conn.sum()
+    return counts
+
+
+def score_documents(args) -> np.ndarray:
+    gold, pred, partial, cutoff = args
+    return score_document(gold, pred, partial, cutoff)
+
+
+def get_results(counts: np.ndarray) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for s_i, subset in enumerate(SUBSETS):
+        results[subset] = {}
+        for m_i, metric in enumerate(METRICS):
+            correct, n_pred, n_gold = counts[s_i, m_i].tolist()
+            precision = correct / n_pred if n_pred else 0.0
+            recall = correct / n_gold if n_gold else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            results[subset][metric] = {'precision': precision, 'recall': recall, 'f1': f1}
+    return results
+
+
+def evaluate(gold_docs: Iterable[Document], pred_docs: Iterable[Document], partial=False, cutoff=0.7,
+             processes=1, chunksize=32) -> Dict[str, Dict[str, Dict[str, float]]]:
+    preds = {doc.doc_id: DocumentRelations.from_document(doc) for doc in pred_docs}
+    jobs = [(DocumentRelations.from_document(doc), preds.pop(doc.doc_id, DocumentRelations.empty()), partial, cutoff)
+            for doc in gold_docs]
+    # predictions for documents without gold annotations only count as false positives
+    jobs.extend((DocumentRelations.empty(), pred, partial, cutoff) for pred in preds.values())
+    counts = np.zeros((len(SUBSETS), len(METRICS), 3), dtype=np.int64)
+    if processes > 1:
+        with Pool(processes) as pool:
+            for doc_counts in pool.imap_unordered(score_documents, jobs, chunksize=chunksize):
+                counts += doc_counts
+    else:
+        for doc_counts in map(score_documents, jobs):
+            counts += doc_counts
+    return get_results(counts)
+
+
+def format_results(results: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+    lines = ['{:<14}{:<10}{:>10}{:>10}{:>10}'.format('subset', 'metric', 'precision', 'recall', 'f1')]
+    for subset, metrics in results.items():
+        for metric, scores in metrics.items():
+            lines.append('{:<14}{:<10}{:>10.4f}{:>10.4f}{:>10.4f}'.format(
+                subset, metric, scores['precision'], scores['recall'], scores['f1']))
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,14 @@
-from typing import List
+import json
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
+from discopy_data.data.embeddings import SentenceCache, get_sentence_key
 from discopy_data.data.sentence import Sentence
 from discopy_data.data.token import Token
+from discopy_data.data.vectors import VectorIndex, get_vector_embeddings
+from discopy_data.nn.registry import get_model
 
 simple_map = {
     "''": '"',
@@ -15,11 +20,56 @@ simple_map = {
     "n't": "not"
 }
 
+POOLINGS = ('first', 'mean', 'last')
+LAYER_POOLINGS = ('concat', 'sum', 'mean', 'scalar_mix')
+# hidden states of the last four layers are concatenated by default
+LAST_FOUR = (-4, -3, -2, -1)
 
-def get_sentence_embedder(bert_model):
-    from transformers import AutoTokenizer, TFAutoModel
-    tokenizer = AutoTokenizer.from_pretrained(bert_model)
-    model = TFAutoModel.from_pretrained(bert_model)
+
+class LayerPooling:
+
+    def __init__(self, mode='concat', layers: Tuple[int, ...] = LAST_FOUR, weights: List[float] = None):
+        # combination of the selected hidden state layers, scalar_mix is a weighted sum with softmax normalized
+        # weights, uniform if none are given
+        if mode not in LAYER_POOLINGS:
+            raise ValueError(f'Unknown layer pooling {mode}, expected one of {LAYER_POOLINGS}.')
+        if weights is not None and len(weights) != len(layers):
+            raise ValueError(f'Got {len(weights)} weights for {len(layers)} layers.')
+        self.mode = mode
+        self.layers = tuple(layers)
+        self.weights = list(weights) if weights is not None else None
+
+    @staticmethod
+    def last(k=1, mode='concat') -> 'LayerPooling':
+        return LayerPooling(mode, tuple(range(-k, 0)))
+
+    @staticmethod
+    def from_config(config: dict) -> 'LayerPooling':
+        return LayerPooling(config['mode'], tuple(config['layers']), config.get('weights'))
+
+    def to_config(self) -> dict:
+        return {'mode': self.mode, 'layers': list(self.layers), 'weights': self.weights}
+
+    def get_mix_weights(self) -> np.ndarray:
+        weights = np.asarray(self.weights if self.weights is not None else [0.0] * len(self.layers), np.float32)
+        weights = np.exp(weights - weights.max())
+        return weights / weights.sum()
+
+    def __call__(self, hidden_states, ops=np):
+        # ops is numpy or tensorflow, with tensorflow only the pooled tensor leaves the model
+        selected = [hidden_states[layer] for layer in self.layers]
+        if self.mode == 'concat':
+            return np.concatenate(selected, axis=-1) if ops is np else ops.concat(selected, axis=-1)
+        if self.mode == 'scalar_mix':
+            selected = [w * h for w, h in zip(self.get_mix_weights().tolist(), selected)]
+            return sum(selected[1:], selected[0])
+        pooled = sum(selected[1:], selected[0])
+        return pooled / len(selected) if self.mode == 'mean' else pooled
+
+
+def get_sentence_embedder(bert_model, device=''):
+    tokenizer = get_model('tokenizer', bert_model)
+    model = get_model('transformer', bert_model, device)
 
     def helper(tokens: List[Token]):
         return get_sentence_embeddings(tokens, tokenizer, model)
@@ -27,50 +77,255 @@ def get_sentence_embedder(bert_model):
     return helper
 
 
-def get_sentence_embeddings(tokens: List[Token], tokenizer, model, last_hidden_only=False):
-    subtokens = [tokenizer.tokenize(simple_map.get(t.surface, t.surface)) for t in tokens]
-    lengths = [len(s) for s in subtokens]
-    tokens_ids = tokenizer.convert_tokens_to_ids([ts for t in subtokens for ts in t])
-    tokens_ids = tokenizer.build_inputs_with_special_tokens(tokens_ids)
-    outputs = model(np.array([tokens_ids]), output_hidden_states=True)
-    if last_hidden_only:
-        hidden_state = outputs.last_hidden_state.numpy()
+def get_sentence_embeddings(tokens: List[Token], tokenizer, model, last_hidden_only=False, pooling='first',
+                            layer_pooling: LayerPooling = None):
+    layer_pooling = layer_pooling or LayerPooling(layers=(-1,) if last_hidden_only else LAST_FOUR)
+    return encode_sentences([[simple_map.get(t.surface, t.surface) for t in tokens]], tokenizer, model,
+                            layer_pooling=layer_pooling, pooling=pooling)[0]
+
+
+def get_sentence_vector_embeddings(tokens: List[Token], embedding_index: VectorIndex, mean, std):
+    return get_vector_embeddings([simple_map.get(t.surface, t.surface) for t in tokens], embedding_index, mean, std)
+
+
+def get_corpus_vector_embeddings(docs: List[List[Sentence]], embedding_index: VectorIndex, mean, std,
+                                 lower=False) -> List[np.ndarray]:
+    # surfaces of all documents are looked up together, out of vocabulary words get vectors seeded by the word
+    words = [simple_map.get(t.surface, t.surface) for doc in docs for sent in doc for t in sent.tokens]
+    embeddings = get_vector_embeddings([w.lower() for w in words] if lower else words, embedding_index, mean, std)
+    bounds = np.cumsum([sum(len(sent.tokens) for sent in doc) for doc in docs])[:-1]
+    return np.split(embeddings, bounds) if docs else []
+
+
+def get_batches(lengths: List[int], max_tokens=8192) -> List[List[int]]:
+    # sequences sorted by length, each batch holds as many as fit into max_tokens including padding
+    order = np.argsort(lengths, kind='stable').tolist()
+    batches, batch, batch_len = [], [], 0
+    for i in order:
+        if batch and max(batch_len, lengths[i]) * (len(batch) + 1) > max_tokens:
+            batches.append(batch)
+            batch, batch_len = [], 0
+        batch.append(i)
+        batch_len = max(batch_len, lengths[i])
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# pooled callables of each model by layer pooling configuration, a compiled graph is traced only once per model
+_pooled_models: 'weakref.WeakKeyDictionary[Any, Dict[str, Callable]]' = weakref.WeakKeyDictionary()
+
+
+def get_pooled_model(model, layer_pooling: LayerPooling):
+    # callable from input ids and attention mask to the pooled hidden state, keras models pool inside a
+    # compiled graph, other models pool the hidden states on the host
+    config = json.dumps(layer_pooling.to_config(), sort_keys=True)
+    try:
+        # cached callables reference the model weakly, so they do not keep evicted models alive
+        pooled_models, model_ref = _pooled_models.setdefault(model, {}), weakref.proxy(model)
+    except TypeError:
+        # models that cannot be weakly referenced are wrapped on each call
+        pooled_models, model_ref = {}, model
+    if config not in pooled_models:
+        pooled_models[config] = build_pooled_model(model_ref, LayerPooling.from_config(layer_pooling.to_config()))
+    return pooled_models[config]
+
+
+def build_pooled_model(model, layer_pooling: LayerPooling):
+    try:
+        import tensorflow as tf
+        is_keras = isinstance(model, tf.keras.Model)
+    except ImportError:
+        is_keras = False
+    if is_keras:
+        @tf.function(input_signature=[tf.TensorSpec([None, None], tf.int32), tf.TensorSpec([None, None], tf.int32)])
+        def graph_model(input_ids, attention_mask):
+            outputs = model({'input_ids': input_ids, 'attention_mask': attention_mask}, output_hidden_states=True)
+            return layer_pooling(outputs.hidden_states, ops=tf)
+
+        return lambda input_ids, attention_mask: graph_model(input_ids, attention_mask).numpy()
+
+    def host_model(input_ids, attention_mask):
+        outputs = model({'input_ids': input_ids, 'attention_mask': attention_mask}, output_hidden_states=True)
+        return layer_pooling([np.asarray(h) for h in outputs.hidden_states])
+
+    return host_model
+
+
+def get_word_ids(tokenizer, sentences: List[List[str]]) -> Tuple[List[List[int]], List[np.ndarray]]:
+    # input ids and the word index of each subtoken (-1 for special tokens) from one tokenizer call
+    if not sentences:
+        return [], []
+    if getattr(tokenizer, 'is_fast', False):
+        encodings = tokenizer(sentences, is_split_into_words=True)
+        word_ids = [np.array([-1 if w is None else w for w in encodings.word_ids(i)], dtype=np.int64)
+                    for i in range(len(sentences))]
+        return encodings['input_ids'], word_ids
+    # slow tokenizers have no word ids, words are tokenized one by one, the subtokens start after the special
+    # tokens that build_inputs_with_special_tokens puts in front, found by position since ids such as the unknown
+    # token may occur in the text as well
+    prefix = tokenizer.build_inputs_with_special_tokens([-1]).index(-1)
+    input_ids, word_ids = [], []
+    for words in sentences:
+        subtokens = [tokenizer.tokenize(w) for w in words]
+        ids = tokenizer.build_inputs_with_special_tokens(
+            tokenizer.convert_tokens_to_ids([ts for t in subtokens for ts in t]))
+        sent_word_ids = np.full(len(ids), -1, dtype=np.int64)
+        n_subtokens = sum(len(t) for t in subtokens)
+        sent_word_ids[prefix:prefix + n_subtokens] = np.repeat(np.arange(len(words)), [len(t) for t in subtokens])
+        input_ids.append(ids)
+        word_ids.append(sent_word_ids)
+    return input_ids, word_ids
+
+
+def pool_subwords(hidden_state: np.ndarray, word_ids: np.ndarray, n_words: List[int],
+                  pooling='first') -> List[np.ndarray]:
+    # one vector per word of each sequence from the first, the last, or the mean of its subtokens,
+    # words without subtokens get zeros
+    flat = hidden_state.reshape(-1, hidden_state.shape[-1])
+    offsets = np.cumsum([0] + list(n_words[:-1]))
+    segments = np.where(word_ids >= 0, word_ids + offsets[:, None], -1).ravel()
+    positions = np.flatnonzero(segments >= 0)
+    segments = segments[positions]
+    starts = np.flatnonzero(np.diff(segments, prepend=-1))
+    ends = np.append(starts[1:], len(positions)) if len(starts) else starts
+    embeddings = np.zeros((sum(n_words), flat.shape[-1]), dtype=np.float32)
+    if pooling == 'first':
+        embeddings[segments[starts]] = flat[positions[starts]]
+    elif pooling == 'last':
+        embeddings[segments[starts]] = flat[positions[ends - 1]]
+    elif pooling == 'mean':
+        sums = np.add.reduceat(flat[positions], starts, axis=0) if len(starts) else flat[:0]
+        embeddings[segments[starts]] = sums / (ends - starts)[:, None]
     else:
-        hidden_state = np.concatenate(outputs.hidden_states[-4:], axis=-1)[0]
-    embeddings = np.zeros((len(lengths), hidden_state.shape[-1]), np.float32)
-    len_left = 1
-    for i, length in enumerate(lengths):
-        embeddings[i] = hidden_state[len_left]
-        len_left += length
-    return embeddings
+        raise ValueError(f'Unknown pooling {pooling}, expected one of {POOLINGS}.')
+    return np.split(embeddings, np.cumsum(n_words)[:-1])
 
 
-def get_sentence_vector_embeddings(tokens: List[Token], embedding_index, mean, std):
-    embedding_dim = len(next(iter(embedding_index.values())))
-    embeddings = np.random.normal(mean, std, (len(tokens), embedding_dim))
-    for i, tok in enumerate(tokens):
-        tok = simple_map.get(tok.surface, tok.surface)
-        if tok in embedding_index:
-            embeddings[i] = embedding_index[tok]
+def get_window_size(tokenizer, window: Optional[int] = None) -> Optional[int]:
+    # the position limit of the model unless a window is given, tokenizers without a known limit report a huge one
+    if window is None:
+        window = getattr(tokenizer, 'model_max_length', None)
+    return window if window is not None and window < 100000 else None
+
+
+def get_content_range(word_ids: np.ndarray) -> Tuple[int, int]:
+    # positions between the special tokens at the start and the end of a sequence
+    words = np.flatnonzero(word_ids >= 0)
+    if not len(words):
+        return 0, 0
+    return int(words[0]), int(words[-1]) + 1
+
+
+def get_windows(word_ids: np.ndarray, window: int, stride: int) -> List[Tuple[int, int]]:
+    # content ranges of overlapping windows over a sequence, the special tokens are repeated in each one,
+    # strides beyond the window content are shortened so that no subtoken is left out
+    begin, end = get_content_range(word_ids)
+    size = max(1, window - (len(word_ids) - (end - begin)))
+    starts = list(range(begin, max(begin, end - size) + 1, min(max(1, stride), size)))
+    if starts[-1] + size < end:
+        starts.append(end - size)
+    return [(start, min(start + size, end)) for start in starts]
+
+
+def encode_sentences(sentences: List[List[str]], tokenizer, model, layer_pooling: LayerPooling = None,
+                     pooling='first', max_tokens=8192, window: Optional[int] = None,
+                     stride: Optional[int] = None) -> List[np.ndarray]:
+    # word embeddings of each sentence, sentences are batched by length
+    # sentences longer than window subtokens are split into windows moving by stride subtokens, the windows share
+    # batches with all other sequences and the subtoken vectors of overlapping windows are averaged
+    input_ids, word_ids = get_word_ids(tokenizer, sentences)
+    window = get_window_size(tokenizer, window)
+    pooled_model = get_pooled_model(model, layer_pooling or LayerPooling())
+    # sentence index and content range of each model input, (0, 0) for complete sentences
+    pieces, piece_ids, piece_word_ids = [], [], []
+    for i, (ids, wids) in enumerate(zip(input_ids, word_ids)):
+        if window is None or len(ids) <= window:
+            pieces.append((i, 0, 0))
+            piece_ids.append(ids)
+            piece_word_ids.append(wids)
+            continue
+        content_begin, content_end = get_content_range(wids)
+        for begin, end in get_windows(wids, window, stride or window // 2):
+            keep = np.r_[0:content_begin, begin:end, content_end:len(ids)]
+            pieces.append((i, begin, end))
+            piece_ids.append(np.asarray(ids)[keep])
+            piece_word_ids.append(wids[keep])
+    embeddings = [None] * len(sentences)
+    # summed subtoken vectors and number of windows covering them for split sentences
+    sums, counts = {}, {}
+    pad_id = tokenizer.pad_token_id or 0
+    for batch in get_batches([len(ids) for ids in piece_ids], max_tokens):
+        batch_len = max(len(piece_ids[p]) for p in batch)
+        ids = np.full((len(batch), batch_len), pad_id, dtype=np.int32)
+        mask = np.zeros((len(batch), batch_len), dtype=np.int32)
+        batch_word_ids = np.full((len(batch), batch_len), -1, dtype=np.int64)
+        for row, p in enumerate(batch):
+            ids[row, :len(piece_ids[p])] = piece_ids[p]
+            mask[row, :len(piece_ids[p])] = 1
+            if not pieces[p][2]:
+                batch_word_ids[row, :len(piece_ids[p])] = piece_word_ids[p]
+        hidden_state = pooled_model(ids, mask)
+        # complete sentences are pooled for the whole batch, windows only contribute their subtoken vectors
+        batch_embeddings = pool_subwords(hidden_state, batch_word_ids,
+                                         [0 if pieces[p][2] else len(sentences[pieces[p][0]]) for p in batch],
+                                         pooling)
+        for row, (p, sent_embeddings) in enumerate(zip(batch, batch_embeddings)):
+            i, begin, end = pieces[p]
+            if not end:
+                embeddings[i] = sent_embeddings
+                continue
+            if i not in sums:
+                sums[i] = np.zeros((len(input_ids[i]), hidden_state.shape[-1]), dtype=np.float32)
+                counts[i] = np.zeros(len(input_ids[i]), dtype=np.float32)
+            offset = get_content_range(piece_word_ids[p])[0]
+            sums[i][begin:end] += hidden_state[row, offset:offset + end - begin]
+            counts[i][begin:end] += 1
+    for i in sums:
+        merged = sums[i] / np.maximum(counts[i], 1)[:, None]
+        embeddings[i] = pool_subwords(merged[None], word_ids[i][None], [len(sentences[i])], pooling)[0]
     return embeddings
 
 
-def get_doc_sentence_embeddings(sentences: List[Sentence], tokenizer, model, last_hidden_only=False):
-    tokens = [[simple_map.get(t.surface, t.surface) for t in sent.tokens] for sent in sentences]
-    subtokens = [[tokenizer.tokenize(t) for t in sent] for sent in tokens]
-    lengths = [[len(t) for t in s] for s in subtokens]
-    inputs = tokenizer(tokens, padding=True, return_tensors='tf', is_split_into_words=True)
-    outputs = model(inputs, output_hidden_states=True)
-    if last_hidden_only:
-        hidden_state = outputs.hidden_states[-2].numpy()
-    else:
-        hidden_state = np.concatenate(outputs.hidden_states[-4:], axis=-1)
-    embeddings = np.zeros((sum(len(s) for s in tokens), hidden_state.shape[-1]), np.float32)
-    e_i = 0
-    for sent_i, _ in enumerate(inputs['input_ids']):
-        len_left = 1
-        for length in lengths[sent_i]:
-            embeddings[e_i] = hidden_state[sent_i][len_left]
-            len_left += length
-            e_i += 1
+def get_corpus_embeddings(docs: List[List[Sentence]], tokenizer, model, last_hidden_only=False,
+                          max_tokens=8192, pooling='first', window: Optional[int] = None,
+                          stride: Optional[int] = None, layer_pooling: LayerPooling = None,
+                          cache: SentenceCache = None, cache_config: dict = None) -> List[np.ndarray]:
+    # sentences of all documents are batched together by length and the token embeddings are scattered back
+    # into one matrix per document, repeated sentences are encoded once
+    # cache_config identifies the model for the sentence cache, only sentences missing from the cache are encoded
+    layer_pooling = layer_pooling or LayerPooling(layers=(-2,) if last_hidden_only else LAST_FOUR)
+    sentences = [[simple_map.get(t.surface, t.surface) for t in sent.tokens] for doc in docs for sent in doc]
+    config = {**(cache_config or {}), 'layer_pooling': layer_pooling.to_config(), 'pooling': pooling,
+              'window': window, 'stride': stride}
+    keys = [get_sentence_key(config, sent) for sent in sentences]
+    unique = {}
+    for key, sent in zip(keys, sentences):
+        unique.setdefault(key, sent)
+    known = cache.get_many(list(unique)) if cache is not None else {}
+    missing = [key for key in unique if key not in known]
+    computed = dict(zip(missing, encode_sentences([unique[key] for key in missing], tokenizer, model,
+                                                  layer_pooling=layer_pooling, pooling=pooling,
+                                                  max_tokens=max_tokens, window=window, stride=stride)
+                                 if missing else []))
+    if cache is not None and computed:
+        cache.put_many(computed)
+    sent_embeddings = [computed[key] if key in computed else known[key] for key in keys]
+    # documents without sentences get no rows but the same dimension as all others
+    hidden_dim = next((e.shape[1] for e in sent_embeddings), 0)
+    embeddings = []
+    sent_i = 0
+    for doc in docs:
+        doc_embeddings = sent_embeddings[sent_i:sent_i + len(doc)]
+        sent_i += len(doc)
+        embeddings.append(np.concatenate(doc_embeddings, axis=0) if doc_embeddings
+                          else np.zeros((0, hidden_dim), np.float32))
     return embeddings
+
+
+def get_doc_sentence_embeddings(sentences: List[Sentence], tokenizer, model, last_hidden_only=False,
+                                max_tokens=8192, pooling='first', window: Optional[int] = None,
+                                stride: Optional[int] = None, layer_pooling: LayerPooling = None,
+                                cache: SentenceCache = None, cache_config: dict = None):
+    return get_corpus_embeddings([sentences], tokenizer, model, last_hidden_only, max_tokens, pooling, window,
+                                 stride, layer_pooling, cache, cache_config)[0]
@@ -0,0 +1,110 @@
+import gc
+import os
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+ModelKey = Tuple[str, str, str]
+
+
+def load_tokenizer(name: str, device: str):
+    from transformers import AutoTokenizer
+    # pre-tokenized input requires a prefix space for byte level tokenizers
+    if name.startswith('roberta'):
+        return AutoTokenizer.from_pretrained(name, add_prefix_space=True)
+    return AutoTokenizer.from_pretrained(name)
+
+
+def load_transformer(name: str, device: str):
+    from transformers import TFAutoModel
+    if not device:
+        return TFAutoModel.from_pretrained(name)
+    import tensorflow as tf
+    with tf.device(device):
+        return TFAutoModel.from_pretrained(name)
+
+
+def load_supar(name: str, device: str):
+    # cpu hides all gpus before torch is initialized, other devices keep the environment as it is
+    if device == 'cpu':
+        os.environ['CUDA_VISIBLE_DEVICES'] = ''
+    import supar
+    return supar.Parser.load(name)
+
+
+def load_trankit(name: str, device: str):
+    import trankit
+    tmp_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        parser = trankit.Pipeline(name, cache_dir=os.path.expanduser('~/.trankit/'), gpu=device not in ('', 'cpu'))
+        parser("Init")
+    finally:
+        sys.stdout = tmp_stdout
+    return parser
+
+
+LOADERS: Dict[str, Callable[[str, str], Any]] = {
+    'tokenizer': load_tokenizer,
+    'transformer': load_transformer,
+    'supar': load_supar,
+    'trankit': load_trankit,
+}
+
+
+class ModelRegistry:
+
+    def __init__(self, loaders: Dict[str, Callable[[str, str], Any]] = None):
+        # one shared instance per (kind, name, device), an empty device leaves the choice to the framework
+        self.loaders = dict(loaders or LOADERS)
+        self.models: Dict[ModelKey, Any] = {}
+        self.lock = threading.RLock()
+
+    def register(self, kind: str, loader: Callable[[str, str], Any]):
+        self.loaders[kind] = loader
+
+    def get(self, kind: str, name: str, device='') -> Any:
+        if kind not in self.loaders:
+            raise ValueError(f'Unknown model kind {kind}, expected one of {tuple(self.loaders)}.')
+        key = (kind, name, device)
+        with self.lock:
+            if key not in self.models:
+                self.models[key] = self.loaders[kind](name, device)
+            return self.models[key]
+
+    def preload(self, keys: Iterable[ModelKey]):
+        # models loaded before a process pool forks are inherited by its workers copy-on-write
+        for kind, name, device in keys:
+            self.get(kind, name, device)
+
+    def evict(self, kind: str = None, name: str = None, device: str = None) -> List[ModelKey]:
+        # drops all models matching the given parts of the key, the memory is freed once callers release them
+        with self.lock:
+            keys = [key for key in self.models
+                    if all(part is None or part == key_part for part, key_part in zip((kind, name, device), key))]
+            for key in keys:
+                del self.models[key]
+        gc.collect()
+        return keys
+
+    def __contains__(self, key: ModelKey):
+        return key in self.models
+
+    def __len__(self):
+        return len(self.models)
+
+
+# process wide registry used by the loaders of this package
+MODELS = ModelRegistry()
+
+
+def get_model(kind: str, name: str, device='') -> Any:
+    return MODELS.get(kind, name, device)
+
+
+def preload_models(keys: Iterable[ModelKey]):
+    MODELS.preload(keys)
+
+
+def evict_models(kind: str = None, name: str = None, device: str = None) -> List[ModelKey]:
+    return MODELS.evict(kind, name, device)
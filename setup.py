@@ -28,6 +28,8 @@ setup(name='discopy-data-rknaebel',
                   'discopy-add-annotations=discopy_data.cli.add_annotations:main',
                   'discopy-extract=discopy_data.cli.extract:main',
                   'discopy-add-parses=discopy_data.cli.update_parses:main',
+                  'discopy-evaluate=discopy_data.cli.evaluate:main',
+                  'discopy-binarize=discopy_data.cli.binarize:main',
             ],
       },
       python_requires='>=3.7',
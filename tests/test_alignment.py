@@ -0,0 +1,32 @@
+from discopy_data.data.alignment import RelationIndex
+from discopy_data.data.doc import Document
+from discopy_data.data.relation import Relation
+from discopy_data.data.sentence import Sentence
+from discopy_data.data.token import Token
+
+
+def make_tokens():
+    return [Token(i, 0, i, i * 2, i * 2 + 1, 'w') for i in range(4)]
+
+
+def test_no_argument_overlap_is_not_aligned():
+    # implicit relations with empty connectives in the same sentence, but disjoint arguments
+    tokens = make_tokens()
+    gold = Relation(arg1=[tokens[0]], arg2=[tokens[1]], type='Implicit')
+    pred = Relation(arg1=[tokens[2]], arg2=[tokens[3]], type='Implicit')
+    doc = Document('doc', sentences=[Sentence(tokens)], relations=[gold])
+    for sentence_blocking in (True, False):
+        index = RelationIndex([doc], sentence_blocking=sentence_blocking)
+        assert index.align('doc', [pred]) == []
+        assert index.align('doc', [pred], optimal=False) == []
+        assert index.get_best_matches('doc', [pred]) == [[]]
+
+
+def test_argument_overlap_is_aligned():
+    tokens = make_tokens()
+    gold = Relation(arg1=[tokens[0]], arg2=[tokens[1]], type='Implicit')
+    pred = Relation(arg1=[tokens[0]], arg2=[tokens[1], tokens[2]], type='Implicit')
+    doc = Document('doc', sentences=[Sentence(tokens)], relations=[gold])
+    index = RelationIndex([doc])
+    assert [(p, g) for p, g, _ in index.align('doc', [pred])] == [(pred, gold)]
+    assert index.get_best_matches('doc', [pred])[0][0][0] is gold